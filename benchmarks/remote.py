@@ -0,0 +1,62 @@
+# Run from the repository root: PYTHONPATH=. python benchmarks/remote.py
+
+import subprocess
+import sys
+import time
+
+from memhax.cpython.collections import PyTupleObject
+from memhax.cpython.primitives import PyBytesObject
+from memhax.native.native import Py_ssize_t
+from memhax.utils import attach
+
+PAYLOAD = 64 * 1024 * 1024
+CHUNK = 1024 * 1024
+RECORD = 64
+STRIDE = 4096
+
+CHILD = f"""
+import sys
+data = bytes(range(256)) * ({PAYLOAD} // 256)
+obj = (1, "abc", 3.5, data)
+print(id(obj), id(data), flush=True)
+sys.stdin.read()
+"""
+
+
+def main():
+    child = subprocess.Popen([sys.executable, "-c", CHILD], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        tuple_address, bytes_address = map(int, child.stdout.readline().split())
+
+        with attach(child.pid) as backend:
+            print(PyTupleObject(tuple_address))
+
+            # Only the header is decoded here; the payload is read in bulk below.
+            start = bytes_address + PyBytesObject.offsetof(PyBytesObject.ob_sval)
+            size = Py_ssize_t(bytes_address + PyBytesObject.offsetof(PyBytesObject.ob_size))()
+            assert backend.read(start, 256) == bytes(range(256))
+
+            began = time.perf_counter()
+            for offset in range(0, size, CHUNK):
+                backend.read(start + offset, min(CHUNK, size - offset))
+            print(f"bulk pread:                {size / (time.perf_counter() - began) / 1e6:>10,.1f} MB/s")
+
+            # Small scattered records, as when walking object headers.
+            records = [(start + offset, RECORD) for offset in range(0, size - RECORD, STRIDE)]
+            total = len(records) * RECORD
+
+            began = time.perf_counter()
+            for address, length in records:
+                backend.read(address, length)
+            print(f"scattered pread:           {total / (time.perf_counter() - began) / 1e6:>10,.1f} MB/s")
+
+            began = time.perf_counter()
+            backend.read_many(records)
+            print(f"scattered process_vm_readv: {total / (time.perf_counter() - began) / 1e6:>9,.1f} MB/s")
+    finally:
+        child.stdin.close()
+        child.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# Run from the repository root: PYTHONPATH=. python benchmarks/scan.py
+
+import ctypes
+import time
+
+from memhax.native.native import LongLong
+from memhax.scanner import ValueScanner
+
+HEAP = 1 << 30
+VALUE = 0x5EED_1234_ABCD
+
+
+def main():
+    heap = bytearray(HEAP)
+    marker = (ctypes.c_longlong * 1).from_buffer(heap, HEAP // 2)
+    marker[0] = VALUE
+
+    scanner = ValueScanner(LongLong)
+    start = time.perf_counter()
+    found = scanner.scan_equal(VALUE)
+    elapsed = time.perf_counter() - start
+    print(f"first scan:  {found:>8,} candidates in {elapsed:.2f}s ({HEAP / elapsed / 1e9:.2f} GB/s of heap alone)")
+
+    marker[0] += 1
+    start = time.perf_counter()
+    found = scanner.next_increased()
+    print(f"next scan:   {found:>8,} candidates in {time.perf_counter() - start:.4f}s")
+
+
+if __name__ == "__main__":
+    main()
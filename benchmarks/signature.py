@@ -0,0 +1,28 @@
+# Run from the repository root: PYTHONPATH=. python benchmarks/signature.py
+
+import struct
+import time
+
+from memhax.scanner import Signature, find_signature
+
+INSTANCES = 500_000
+
+
+class Marker:
+    pass
+
+
+def main():
+    objects = [Marker() for _ in range(INSTANCES)]
+    # Every instance stores a pointer to its type right after the refcount.
+    signature = Signature.from_bytes(struct.pack("@P", id(Marker)))
+
+    for threads in (1, 2, 4, 8):
+        start = time.perf_counter()
+        found = find_signature(signature, alignment=8, threads=threads)
+        print(f"{threads} threads: {len(found):>9,} matches in {time.perf_counter() - start:.2f}s")
+    assert len(objects) == INSTANCES
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Run from the repository root: PYTHONPATH=. python benchmarks/threads.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from memhax.backends import FileMemoryBackend, DirectMemoryBackend
+from memhax.cpython.object import PyObject
+from memhax.utils import use_backend
+
+HEADERS = 200_000
+
+
+def decode(addresses):
+    for address in addresses:
+        obj = PyObject(address)
+        obj.ob_refcnt()
+        obj.ob_type.raw()
+
+
+def run(addresses, threads: int) -> float:
+    chunks = [addresses[i::threads] for i in range(threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        for future in [pool.submit(decode, chunk) for chunk in chunks]:
+            future.result()
+    return len(addresses) / (time.perf_counter() - start)
+
+
+def main():
+    objects = [object() for _ in range(HEADERS)]
+    addresses = [id(obj) for obj in objects]
+
+    for backend in (FileMemoryBackend(), DirectMemoryBackend()):
+        with use_backend(backend):
+            for threads in (1, 2, 4, 8):
+                print(f"{backend.__class__.__name__:<20} {threads} threads: {run(addresses, threads):>12,.0f} headers/s")
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,30 @@
+import ctypes
+
 from memhax.cpython.object import PyObject
 from memhax.cpython.primitives import PyUnicodeObject, PyLongObject
 from memhax.cpython.collections import PyTupleObject, PyListObject
+from memhax.cpython.heap import find_instances
+from memhax.native.native import LongLong
+from memhax.native.native_size import uint32_t, uint64_t
+from memhax.native.native_complex import Pointer
+from memhax.native.structs import Struct
+from memhax.scanner import ValueScanner
+
+
+class Node(Struct):
+    value: LongLong
+    next: Pointer['Node']
+
+
+class CNode(ctypes.Structure):
+    pass
+
+
+CNode._fields_ = [("value", ctypes.c_longlong), ("next", ctypes.POINTER(CNode))]
+
+
+class Item:
+    pass
 
 
 def main():
@@ -21,6 +45,20 @@ def main():
     z = ["a", b"b"]
     z_repr = PyListObject(id(z))
     print(z_repr)
+    tail = CNode(2)
+    head = CNode(1, ctypes.pointer(tail))
+    print(Node.sizeof())
+    print(Node(ctypes.addressof(head)))
+    for element_type, ctype, value in ((uint32_t, ctypes.c_uint32, 0xF1E2D3C4), (uint64_t, ctypes.c_uint64, 0xF1E2D3C4B5A69788)):
+        cell = ctype(value)
+        scanner = ValueScanner(element_type)
+        assert scanner.scan_equal(value) == 1 and scanner.scan_range(value - 1, value + 1) == 1
+        cell.value = value + 1
+        assert scanner.next_increased() == 1 and scanner.addresses().tolist() == [ctypes.addressof(cell)]
+        print(element_type.__name__, scanner.values.tolist())
+    items = [Item() for _ in range(1000)]
+    assert sorted(find_instances(Item)) == sorted(map(id, items))
+    print(len(items), "Item instances")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,296 @@
+import ctypes
+import os
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain
+from mmap import PAGESIZE
+from struct import Struct as _CompiledFormat
+from threading import RLock
+from typing import Tuple, Any, List, Sequence, Optional, Dict
+
+from memhax.maps import MemoryMap
+
+__all__ = ("MemoryBackend", "FileMemoryBackend", "DirectMemoryBackend", "CachedMemoryBackend", "compiled_format")
+
+_IOV_MAX = 1024
+
+
+class _iovec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_process_vm_readv = getattr(_libc, "process_vm_readv", None)
+if _process_vm_readv is not None:
+    _process_vm_readv.argtypes = [ctypes.c_int, ctypes.POINTER(_iovec), ctypes.c_ulong, ctypes.POINTER(_iovec), ctypes.c_ulong, ctypes.c_ulong]
+    _process_vm_readv.restype = ctypes.c_ssize_t
+
+
+@lru_cache(maxsize=None)
+def compiled_format(fmt: str) -> _CompiledFormat:
+    return _CompiledFormat(fmt)
+
+
+class MemoryBackend:
+    # Whether addresses refer to the current process, so that they can be turned back into Python objects.
+    local = True
+    pid: Optional[int] = None
+    _memory_map: Optional[MemoryMap] = None
+
+    @property
+    def memory_map(self) -> MemoryMap:
+        if self._memory_map is None:
+            self._memory_map = MemoryMap(None if self.local else self.pid)
+        return self._memory_map
+
+    def read(self, address: int, size: int) -> bytes:
+        raise NotImplementedError(self.__class__.__name__)
+
+    def write(self, address: int, data: bytes) -> int:
+        raise NotImplementedError(self.__class__.__name__)
+
+    def read_many(self, regions: Sequence[Tuple[int, int]]) -> List[bytes]:
+        return [self.read(address, size) for address, size in regions]
+
+    def readinto(self, address: int, buffer) -> int:
+        # Fills a writable buffer from address; returns the number of bytes read.
+        view = memoryview(buffer).cast("B")
+        data = self.read(address, view.nbytes)
+        view[:len(data)] = data
+        return len(data)
+
+    def readinto_many(self, regions: Sequence[Tuple[int, int]], buffer) -> int:
+        # Reads the regions back to back into a writable buffer; returns the number of bytes filled.
+        view = memoryview(buffer).cast("B")
+        offset = 0
+        for address, size in regions:
+            self.readinto(address, view[offset:offset + size])
+            offset += size
+        return offset
+
+    def unpack(self, fmt: str, address: int) -> Tuple[Any, ...]:
+        compiled = compiled_format(fmt)
+        return compiled.unpack(self.read(address, compiled.size))
+
+    def pack(self, fmt: str, address: int, *values: Any) -> int:
+        return self.write(address, compiled_format(fmt).pack(*values))
+
+    def close(self) -> None:
+        pass
+
+
+class FileMemoryBackend(MemoryBackend):
+    # Positional I/O keeps no shared file offset, so one backend can be used from many threads.
+    def __init__(self, pid: Optional[int] = None):
+        self.pid = os.getpid() if pid is None else pid
+        self.local = self.pid == os.getpid()
+        self.path = "/proc/self/mem" if pid is None else f"/proc/{pid}/mem"
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CLOEXEC)
+        except PermissionError:
+            self._fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+
+    def read(self, address: int, size: int) -> bytes:
+        return os.pread(self._fd, size, address)
+
+    def readinto(self, address: int, buffer) -> int:
+        return os.preadv(self._fd, [buffer], address)
+
+    def write(self, address: int, data: bytes) -> int:
+        return os.pwrite(self._fd, data, address)
+
+    def read_many(self, regions: Sequence[Tuple[int, int]]) -> List[bytes]:
+        if _process_vm_readv is None:
+            return super().read_many(regions)
+        results = []
+        for start in range(0, len(regions), _IOV_MAX):
+            results.extend(self._readv(regions[start:start + _IOV_MAX]))
+        return results
+
+    def readinto_many(self, regions: Sequence[Tuple[int, int]], buffer) -> int:
+        if _process_vm_readv is None:
+            return super().readinto_many(regions, buffer)
+        view = memoryview(buffer).cast("B")
+        offset = 0
+        for start in range(0, len(regions), _IOV_MAX):
+            batch = regions[start:start + _IOV_MAX]
+            total = sum(size for _, size in batch)
+            local = _iovec(ctypes.addressof((ctypes.c_char * total).from_buffer(view[offset:offset + total])), total)
+            remote = (_iovec * len(batch)).from_buffer(array("Q", chain.from_iterable(batch)))
+            done = _process_vm_readv(self.pid, ctypes.byref(local), 1, remote, len(batch), 0)
+            if done < total:
+                # As in _readv, the regions after a failed one are re-read so errors surface normally.
+                super().readinto_many(batch, view[offset:offset + total])
+            offset += total
+        return offset
+
+    def _readv(self, regions: Sequence[Tuple[int, int]]) -> List[bytes]:
+        # One process_vm_readv call scatters every region into a single local buffer.
+        total = sum(size for _, size in regions)
+        buffer = bytearray(total)
+        local = _iovec(ctypes.addressof((ctypes.c_char * total).from_buffer(buffer)), total)
+        remote = (_iovec * len(regions)).from_buffer(array("Q", chain.from_iterable(regions)))
+        done = _process_vm_readv(self.pid, ctypes.byref(local), 1, remote, len(regions), 0)
+
+        view = memoryview(buffer)
+        results = []
+        offset = 0
+        for address, size in regions:
+            if offset + size <= done:
+                results.append(view[offset:offset + size].tobytes())
+            else:
+                # Transfers stop at the first region that fails; re-read the rest so errors surface normally.
+                results.append(self.read(address, size))
+            offset += size
+        return results
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        if self._memory_map is not None:
+            self._memory_map.close()
+
+
+class DirectMemoryBackend(MemoryBackend):
+    # Reads and writes the current process through ctypes, without any syscalls.
+    # Unlike /proc/self/mem, touching unmapped or read-only memory crashes the interpreter.
+    def view(self, address: int, size: int) -> memoryview:
+        return memoryview((ctypes.c_char * size).from_address(address)).cast("B")
+
+    def read(self, address: int, size: int) -> bytes:
+        return ctypes.string_at(address, size)
+
+    def readinto(self, address: int, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        ctypes.memmove((ctypes.c_char * view.nbytes).from_buffer(view), address, view.nbytes)
+        return view.nbytes
+
+    def write(self, address: int, data: bytes) -> int:
+        size = memoryview(data).nbytes
+        self.view(address, size)[:] = memoryview(data).cast("B")
+        return size
+
+    def read_many(self, regions: Sequence[Tuple[int, int]]) -> List[bytes]:
+        return [ctypes.string_at(address, size) for address, size in regions]
+
+    def unpack(self, fmt: str, address: int) -> Tuple[Any, ...]:
+        compiled = compiled_format(fmt)
+        return compiled.unpack_from((ctypes.c_char * compiled.size).from_address(address))
+
+    def pack(self, fmt: str, address: int, *values: Any) -> int:
+        compiled = compiled_format(fmt)
+        compiled.pack_into((ctypes.c_char * compiled.size).from_address(address), 0, *values)
+        return compiled.size
+
+
+class CachedMemoryBackend(MemoryBackend):
+    # Page-granular LRU cache in front of another backend. Cached pages go stale when the target changes them,
+    # so call invalidate() or read inside snapshot() for a consistent view.
+    def __init__(self, backend: MemoryBackend, max_pages: int = 1024):
+        self.backend = backend
+        self.local = backend.local
+        self.pid = backend.pid
+        self.max_pages = max_pages
+        self._pages: OrderedDict[int, bytes] = OrderedDict()
+        # Pages read since the outermost snapshot() was entered; None outside of one.
+        self._snapshot: Optional[Dict[int, bytes]] = None
+        self._snapshots = 0
+        self._lock = RLock()
+
+    @property
+    def memory_map(self) -> MemoryMap:
+        return self.backend.memory_map
+
+    def _store(self, index: int, page: bytes) -> None:
+        if self._snapshot is not None:
+            self._snapshot[index] = page
+        self._pages[index] = page
+        self._pages.move_to_end(index)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def _cached(self, index: int) -> Optional[bytes]:
+        # Inside a snapshot only pages read during it count; older cached pages are read again.
+        if self._snapshot is not None:
+            return self._snapshot.get(index)
+        page = self._pages.get(index)
+        if page is not None:
+            self._pages.move_to_end(index)
+        return page
+
+    def _page(self, index: int) -> bytes:
+        page = self._cached(index)
+        if page is None:
+            page = self.backend.read(index * PAGESIZE, PAGESIZE)
+            self._store(index, page)
+        return page
+
+    def _assemble(self, address: int, size: int) -> bytes:
+        first, last = address // PAGESIZE, (address + size - 1) // PAGESIZE
+        offset = address - first * PAGESIZE
+        if first == last:
+            return self._page(first)[offset:offset + size]
+        data = b"".join(self._page(index) for index in range(first, last + 1))
+        return data[offset:offset + size]
+
+    def read(self, address: int, size: int) -> bytes:
+        if size <= 0:
+            return b""
+        with self._lock:
+            return self._assemble(address, size)
+
+    def read_many(self, regions: Sequence[Tuple[int, int]]) -> List[bytes]:
+        with self._lock:
+            missing = sorted({
+                index
+                for address, size in regions if size > 0
+                for index in range(address // PAGESIZE, (address + size - 1) // PAGESIZE + 1)
+                if index not in (self._pages if self._snapshot is None else self._snapshot)
+            })
+            pages = self.backend.read_many([(index * PAGESIZE, PAGESIZE) for index in missing])
+            for index, page in zip(missing, pages):
+                self._store(index, page)
+            return [self._assemble(address, size) if size > 0 else b"" for address, size in regions]
+
+    def write(self, address: int, data: bytes) -> int:
+        with self._lock:
+            written = self.backend.write(address, data)
+            self.invalidate(address, len(data))
+            return written
+
+    def invalidate(self, address: Optional[int] = None, size: int = 1) -> None:
+        with self._lock:
+            if address is None:
+                self._pages.clear()
+                if self._snapshot is not None:
+                    self._snapshot.clear()
+                return
+            for index in range(address // PAGESIZE, (address + max(size, 1) - 1) // PAGESIZE + 1):
+                self._pages.pop(index, None)
+                if self._snapshot is not None:
+                    self._snapshot.pop(index, None)
+
+    @contextmanager
+    def snapshot(self):
+        # Every page is read from the target once and then kept until the outermost snapshot exits, so the walk sees
+        # one consistent copy. These pages are not bounded by max_pages: a snapshot holds every page it touched.
+        with self._lock:
+            if not self._snapshots:
+                self._snapshot = {}
+            self._snapshots += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._snapshots -= 1
+                if not self._snapshots:
+                    self._snapshot = None
+
+    def close(self) -> None:
+        self.invalidate()
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from time import perf_counter
+from typing import Dict, List, NamedTuple, Optional, Tuple, Set, Iterable, Iterator, Any
+
+from memhax.cpython.heap import Py_TPFLAGS_HAVE_GC, PyGC_HEAD_SIZE
+from memhax.cpython.object import PyTypeObject
+from memhax.cpython.pymalloc import PymallocHeap, arena_object, block_size, SMALL_REQUEST_THRESHOLD, ARENA_SIZE
+from memhax.native.native_complex import NullTerminatedString
+from memhax.utils import get_backend
+
+__all__ = ("TypeCount", "TypeDiff", "CensusResult", "Census", "census")
+
+Py_TPFLAGS_MANAGED_DICT = 1 << 4
+Py_TPFLAGS_HEAPTYPE = 1 << 9
+Py_TPFLAGS_READY = 1 << 12
+Py_TPFLAGS_TYPE_SUBCLASS = 1 << 31
+
+# Type objects are recognized from their header: ob_type (word 1), tp_basicsize, tp_itemsize and tp_flags.
+_BASICSIZE = PyTypeObject.offsetof(PyTypeObject.tp_basicsize) // 8
+_ITEMSIZE = PyTypeObject.offsetof(PyTypeObject.tp_itemsize) // 8
+_NAME = PyTypeObject.offsetof(PyTypeObject.tp_name) // 8
+_FLAGS = PyTypeObject.offsetof(PyTypeObject.tp_flags) // 8
+_TYPE_HEADER = (_FLAGS + 1) * 8
+_GC_WORDS = PyGC_HEAD_SIZE // 8
+# Objects with a managed __dict__ keep the dict and values pointers before the PyGC_Head.
+_MANAGED_DICT_WORDS = 2
+_OFFSETS = (0, _GC_WORDS, _GC_WORDS + _MANAGED_DICT_WORDS)
+
+
+class TypeCount(NamedTuple):
+    name: str
+    count: int
+    size: int
+
+
+class TypeDiff(NamedTuple):
+    name: str
+    count: int
+    size: int
+    count_delta: int
+    size_delta: int
+
+
+class CensusResult:
+    def __init__(self, types: Dict[int, TypeCount], elapsed: float):
+        # Keyed by type object address.
+        self.types = types
+        # Seconds from the start of the pass to its end, including the time between steps.
+        self.elapsed = elapsed
+
+    @property
+    def count(self) -> int:
+        return sum(entry.count for entry in self.types.values())
+
+    @property
+    def size(self) -> int:
+        return sum(entry.size for entry in self.types.values())
+
+    def by_name(self) -> Dict[str, TypeCount]:
+        # Merges distinct types that share a tp_name.
+        merged: Dict[str, TypeCount] = {}
+        for entry in self.types.values():
+            previous = merged.get(entry.name)
+            merged[entry.name] = entry if previous is None else TypeCount(entry.name, previous.count + entry.count, previous.size + entry.size)
+        return merged
+
+    def most_common(self, n: Optional[int] = None) -> List[TypeCount]:
+        return sorted(self.types.values(), key=lambda entry: entry.size, reverse=True)[:n]
+
+    def diff(self, previous: CensusResult) -> List[TypeDiff]:
+        # Growth per type since previous, largest byte growth first; unchanged types are left out.
+        # A freed heap type's address can be reused by a new type, so types are matched on address and name.
+        before = {(address, entry.name): entry for address, entry in previous.types.items()}
+        after = {(address, entry.name): entry for address, entry in self.types.items()}
+        empty = TypeCount("", 0, 0)
+        diffs = []
+        for key in after.keys() | before.keys():
+            old, new = before.get(key, empty), after.get(key, empty)
+            if old.count != new.count or old.size != new.size:
+                diffs.append(TypeDiff(key[1], new.count, new.size, new.count - old.count, new.size - old.size))
+        diffs.sort(key=lambda entry: entry.size_delta, reverse=True)
+        return diffs
+
+    def __repr__(self):
+        return f"<CensusResult {len(self.types)} types, {self.count} objects, {self.size} bytes>"
+
+
+class Census:
+    # Counts live objects in pymalloc pools per ob_type, a few arenas at a time.
+    # Only objects up to 512 bytes live in pools; larger ones come from the system allocator and are not counted.
+    def __init__(self, heap: Optional[PymallocHeap] = None):
+        self.heap = heap
+        # type address -> (tp_name, tp_basicsize, tp_itemsize, pre-header words), kept across passes.
+        self._types: Dict[int, Tuple[str, int, int, int]] = {}
+        self._metatypes: Dict[int, bool] = {}
+        # Heap types can be freed and their address reused, so these are re-read once per pass.
+        self._heap_types: Set[int] = set()
+        # Mapped words seen in an ob_type slot that are not types; only kept for one arena to bound its size.
+        self._rejected: Set[int] = set()
+        self._counts: Dict[int, List[int]] = {}
+        self._arena = 0
+        self._arena_starts: List[int] = []
+        self._pools: Optional[Iterator[Tuple[int, Dict[str, Any], bytes]]] = None
+        self._started: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._started is not None
+
+    def step(self, budget: float) -> Optional[CensusResult]:
+        # Scans pools for about `budget` seconds; returns the result when this step completes a pass, else None.
+        deadline = perf_counter() + budget
+        if self._started is None:
+            if self.heap is None:
+                self.heap = PymallocHeap.discover()
+            self._started = perf_counter()
+            for address in self._heap_types:
+                del self._types[address]
+            self._heap_types = set()
+            self._metatypes = {}
+            self._counts = {}
+            self._arena = 0
+        while True:
+            if self._pools is None:
+                self._pools = self._next_arena()
+                if self._pools is None:
+                    return self._finish()
+            for pool, header, data in self._pools:
+                self._count_pool(pool, header, data)
+                if perf_counter() >= deadline:
+                    return None
+            self._pools = None
+
+    def run(self) -> CensusResult:
+        # Completes the pass in progress, or a whole new one, without a time limit.
+        result = None
+        while result is None:
+            result = self.step(float("inf"))
+        return result
+
+    def _next_arena(self) -> Optional[Iterator[Tuple[int, Dict[str, Any], bytes]]]:
+        # Arenas come and go between steps, so the array is re-read each time and resumed by index.
+        # The map is refreshed with it; words probed as type pointers do not re-read it on every miss.
+        self.heap.refresh()
+        get_backend().memory_map.refresh()
+        arenas = self.heap.arena_objects()
+        self._arena_starts = sorted(arena["address"] for _, arena in arenas)
+        for address, arena in arenas:
+            index = (address - self.heap.arenas) // arena_object.sizeof()
+            if index >= self._arena:
+                self._arena = index + 1
+                self._rejected = set()
+                return self.heap.arena_pools(arena)
+        return None
+
+    def _finish(self) -> CensusResult:
+        types = {address: TypeCount(self._types[address][0], count, size) for address, (count, size) in self._counts.items()}
+        result = CensusResult(types, perf_counter() - self._started)
+        self._started = None
+        self._rejected = set()
+        return result
+
+    def _count_pool(self, pool: int, header: Dict[str, Any], data: bytes) -> None:
+        words = array("q", data)
+        stride = block_size(header["szidx"]) // 8
+        blocks = [(block - pool) // 8 for block in PymallocHeap.allocated(pool, header, data)]
+        # The object follows its type's pre-header, so each possible offset gives an ob_type candidate.
+        offsets = [offset for offset in _OFFSETS if offset + 2 <= stride]
+        candidates = {words[index + offset + 1] for index in blocks for offset in offsets} - self._types.keys() - self._rejected
+        # Type objects are larger than any pool block, so pointers into arenas are dropped without being remembered.
+        starts = self._arena_starts
+        self._resolve({word for word in candidates if word > 0 and not word & 7 and not self._in_arena(starts, word)})
+
+        types, counts = self._types, self._counts
+        for index in blocks:
+            for offset in offsets:
+                ob_type = words[index + offset + 1]
+                info = types.get(ob_type)
+                if info is not None and info[3] == offset:
+                    break
+            else:
+                continue
+            start = index + offset
+            # A zero refcount is an object parked on a free list.
+            if words[start] <= 0:
+                continue
+            _, basicsize, itemsize, _ = info
+            size = basicsize
+            if itemsize:
+                if offset + 3 > stride:
+                    continue
+                size += abs(words[start + 2]) * itemsize
+            # Whatever does not fit its block is stale data that happens to look like an object.
+            if size > (stride - offset) * 8:
+                continue
+            entry = counts.get(ob_type)
+            if entry is None:
+                counts[ob_type] = [1, size]
+            else:
+                entry[0] += 1
+                entry[1] += size
+
+    @staticmethod
+    def _in_arena(starts: List[int], address: int) -> bool:
+        index = bisect_right(starts, address) - 1
+        return index >= 0 and address < starts[index] + ARENA_SIZE
+
+    def _resolve(self, candidates: Set[int]) -> None:
+        # Decides which unknown ob_type words are type objects, batching the reads.
+        headers = self._read_headers(candidates)
+        metatypes = {words[1] for words in headers.values()} - self._metatypes.keys()
+        # The type of a type is `type` or a metaclass, both flagged as subclasses of `type`.
+        meta_headers = self._read_headers(metatypes)
+        for address in metatypes:
+            words = meta_headers.get(address)
+            self._metatypes[address] = words is not None and bool(words[_FLAGS] & Py_TPFLAGS_TYPE_SUBCLASS)
+        memory_map = get_backend().memory_map
+        for address, words in headers.items():
+            name = None
+            # Types of larger objects are skipped too: their instances never live in a pool.
+            if self._metatypes[words[1]] and words[_FLAGS] & Py_TPFLAGS_READY and 0 < words[_BASICSIZE] <= SMALL_REQUEST_THRESHOLD \
+                    and 0 <= words[_ITEMSIZE] <= SMALL_REQUEST_THRESHOLD and memory_map.find(words[_NAME], refresh=False) is not None:
+                try:
+                    # tp_name is read once per type address.
+                    name = NullTerminatedString(words[_NAME]).get()
+                except ValueError:
+                    pass
+            if not name or not name.isprintable():
+                self._rejected.add(address)
+                continue
+            flags = words[_FLAGS]
+            offset = (_GC_WORDS if flags & Py_TPFLAGS_HAVE_GC else 0) + (_MANAGED_DICT_WORDS if flags & Py_TPFLAGS_MANAGED_DICT else 0)
+            self._types[address] = (name, words[_BASICSIZE], words[_ITEMSIZE], offset)
+            if flags & Py_TPFLAGS_HEAPTYPE:
+                self._heap_types.add(address)
+
+    @staticmethod
+    def _read_headers(addresses: Iterable[int]) -> Dict[int, array]:
+        backend = get_backend()
+        memory_map = backend.memory_map
+        readable = []
+        for address in addresses:
+            if address <= 0 or address % 8:
+                continue
+            region = memory_map.find(address, refresh=False)
+            if region is not None and region.readable and address + _TYPE_HEADER <= region.end:
+                readable.append(address)
+        data = backend.read_many([(address, _TYPE_HEADER) for address in readable])
+        return {address: array("q", chunk) for address, chunk in zip(readable, data)}
+
+
+def census(heap: Optional[PymallocHeap] = None) -> CensusResult:
+    return Census(heap).run()
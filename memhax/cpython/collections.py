@@ -1,8 +1,28 @@
+from array import array
+from itertools import compress
+from operator import and_
+from typing import Optional, Self, Type, Iterator, Tuple, NamedTuple
+
 from memhax.cpython.object import PyVarObject, PyObject
-from memhax.native.native import Py_ssize_t
+from memhax.element import Element
+from memhax.native.native import Py_ssize_t, Byte, Short, Integer, LongLong
 from memhax.native.native_complex import PropertySizeArray, Pointer, StaticSizeArray
-from memhax.native.native_size import uint64_t
+from memhax.native.native_size import uint8_t, uint32_t, uint64_t
 from memhax.native.structs import Struct
+from memhax.utils import get_backend, numpy_or_none
+
+DKIX_EMPTY = -1
+DKIX_DUMMY = -2
+DICT_KEYS_GENERAL = 0
+DICT_KEYS_UNICODE = 1
+DICT_KEYS_SPLIT = 2
+# setobject.c probing parameters
+LINEAR_PROBES = 9
+PERTURB_SHIFT = 5
+_SIZE_T_MASK = (1 << 64) - 1
+
+
+_SET_ENTRY_DTYPE = [("key", "u8"), ("hash", "i8")]
 
 
 class PyTupleObject(PyVarObject, Struct[tuple]):
@@ -19,20 +39,201 @@ class _PySetEntry(Struct[None]):
     hash: Py_ssize_t
 
 
+class SetTableStats(NamedTuple):
+    slots: int
+    used: int
+    dummies: int
+    load_factor: float
+    fill_factor: float
+    mean_probes: float
+    max_probes: int
+
+
+def _probe_length(hash_: int, slot: int, mask: int) -> int:
+    # Number of slots set_add_entry() inspects before reaching `slot`, following setobject.c.
+    perturb = hash_ & _SIZE_T_MASK
+    i = perturb & mask
+    probes = 0
+    for _ in range(2 * (mask + 1) + 64):
+        for j in range(i, i + (LINEAR_PROBES + 1 if i + LINEAR_PROBES <= mask else 1)):
+            probes += 1
+            if j == slot:
+                return probes
+        perturb >>= PERTURB_SHIFT
+        i = (i * 5 + 1 + perturb) & mask
+    raise ValueError(f"Slot {slot} is not on the probe sequence of hash {hash_}")
+
+
 class PySetObject(PyObject, Struct[set]):
     fill: Py_ssize_t
     used: Py_ssize_t
     mask: Py_ssize_t
-    table: Pointer[PropertySizeArray[_PySetEntry, lambda self: self.fill()]]
+    table: Pointer[PropertySizeArray[_PySetEntry, lambda self: self.mask() + 1]]
     hash: Py_ssize_t
     finger: Py_ssize_t
     smalltable: StaticSizeArray[_PySetEntry, 8]
     weakreflist: Pointer[PyObject]
 
+    def read_table(self) -> array:
+        # All mask + 1 slots as alternating key, hash words, in one read.
+        header = self.snapshot()
+        return array("q", get_backend().read(header["table"], (header["mask"] + 1) * 16))
+
+    @staticmethod
+    def _live_numpy(np, table: array):
+        # The live slots as a structured array, selected with one mask over the whole table:
+        # empty slots have a NULL key, dummy slots hash to -1.
+        entries = np.frombuffer(table, dtype=_SET_ENTRY_DTYPE)
+        return entries[(entries["key"] != 0) & (entries["hash"] != -1)]
+
+    def _live_entries(self) -> Tuple[array, array]:
+        # Keys and hashes of the live slots, in table order. Without numpy the slots are filtered one by one.
+        table = self.read_table()
+        np = numpy_or_none()
+        if np is not None:
+            live = self._live_numpy(np, table)
+            return array("Q", live["key"].tobytes()), array("q", live["hash"].tobytes())
+        keys, hashes = table[0::2], table[1::2]
+        live = list(map(and_, map(bool, keys), map((-1).__ne__, hashes)))
+        return array("Q", compress(keys, live)), array("q", compress(hashes, live))
+
+    def key_addresses(self) -> Iterator[int]:
+        return iter(self._live_entries()[0])
+
+    def iter_keys(self) -> Iterator[PyObject]:
+        for key in self.key_addresses():
+            yield PyObject(key)
+
+    def to_hash_array(self) -> array:
+        # Hashes of the live entries, in table order.
+        return self._live_entries()[1]
+
+    def to_numpy(self):
+        np = numpy_or_none()
+        if np is None:
+            raise ImportError("PySetObject.to_numpy() requires numpy")
+        return self._live_numpy(np, self.read_table())
+
+    def table_stats(self) -> SetTableStats:
+        table = self.read_table()
+        mask = len(table) // 2 - 1
+        used = dummies = total = longest = 0
+        for slot, (key, hash_) in enumerate(zip(table[0::2], table[1::2])):
+            if not key:
+                continue
+            if hash_ == -1:
+                dummies += 1
+                continue
+            probes = _probe_length(hash_, slot, mask)
+            used += 1
+            total += probes
+            longest = max(longest, probes)
+        slots = mask + 1
+        return SetTableStats(slots, used, dummies, used / slots, (used + dummies) / slots, total / used if used else 0.0, longest)
+
+
+class PyDictKeyEntry(Struct[None]):
+    me_hash: Py_ssize_t
+    me_key: Pointer[PyObject]
+    me_value: Pointer[PyObject]
+
+
+class PyDictUnicodeEntry(Struct[None]):
+    me_key: Pointer[PyObject]
+    me_value: Pointer[PyObject]
+
+
+_INDEX_TYPES = {1: Byte, 2: Short, 4: Integer, 8: LongLong}
+_ENTRY_ARRAYS = {
+    PyDictKeyEntry: PropertySizeArray[PyDictKeyEntry, lambda self: self.dk_nentries()],
+    PyDictUnicodeEntry: PropertySizeArray[PyDictUnicodeEntry, lambda self: self.dk_nentries()],
+}
+
+
+class PyDictKeysObject(Struct[None]):
+    dk_refcnt: Py_ssize_t
+    dk_log2_size: uint8_t
+    dk_log2_index_bytes: uint8_t
+    dk_kind: uint8_t
+    dk_version: uint32_t
+    dk_usable: Py_ssize_t
+    dk_nentries: Py_ssize_t
+    # Followed by dk_indices (1 << dk_log2_index_bytes bytes) and the entry table; both depend on the header.
+
+    @classmethod
+    def sizeof(cls, instance: Optional[Self] = None) -> int:
+        size = super().sizeof()
+        if instance is None:
+            return size
+        header = instance.snapshot()
+        capacity = header["dk_usable"] + header["dk_nentries"]
+        return size + (1 << header["dk_log2_index_bytes"]) + capacity * instance.entry_type(header["dk_kind"]).sizeof()
+
+    def entry_type(self, kind: Optional[int] = None) -> Type[Struct]:
+        if kind is None:
+            kind = self.dk_kind()
+        return PyDictKeyEntry if kind == DICT_KEYS_GENERAL else PyDictUnicodeEntry
+
+    def index_type(self) -> Type[Element]:
+        header = self.snapshot()
+        return _INDEX_TYPES[(1 << header["dk_log2_index_bytes"]) >> header["dk_log2_size"]]
+
+    def indices_address(self) -> int:
+        return self.address + super().sizeof()
+
+    def entries_address(self, log2_index_bytes: Optional[int] = None) -> int:
+        if log2_index_bytes is None:
+            log2_index_bytes = self.dk_log2_index_bytes()
+        return self.indices_address() + (1 << log2_index_bytes)
+
+    def indices(self) -> array:
+        # The whole hash index in one read; slots hold an entry index, DKIX_EMPTY or DKIX_DUMMY.
+        return array(self.index_type().typecode(), get_backend().read(self.indices_address(), 1 << self.dk_log2_index_bytes()))
+
+    def entries(self) -> PropertySizeArray:
+        header = self.snapshot()
+        entries = _ENTRY_ARRAYS[self.entry_type(header["dk_kind"])](self.entries_address(header["dk_log2_index_bytes"]))
+        entries.set_root(self)
+        return entries
+
+    def children(self) -> Iterator[Tuple[str, Element, bool]]:
+        yield from super().children()
+        yield "dk_entries", self.entries(), False
+
 
 class PyDictObject(PyObject, Struct[dict]):
     ma_used: Py_ssize_t
     ma_version_tag: uint64_t
-    # TODO: PyDictKeysObject; It's a fairly complex struct so not implemented yet
-    ma_keys: Pointer
-    ma_values: Pointer[PropertySizeArray[Pointer[PyObject], lambda self: self.ma_used()]]
+    ma_keys: Pointer[PyDictKeysObject]
+    # Split tables allocate one slot per possible shared key, not per used key.
+    ma_values: Pointer[PropertySizeArray[Pointer[PyObject], lambda self: self.ma_keys().dk_usable() + self.ma_keys().dk_nentries()]]
+
+    def item_addresses(self) -> Iterator[Tuple[int, int]]:
+        # (key, value) addresses in iteration order, from one read of the entry table (plus the values for split tables).
+        backend = get_backend()
+        header = self.snapshot()
+        keys = PyDictKeysObject(header["ma_keys"])
+        keys_header = keys.snapshot()
+        nentries = keys_header["dk_nentries"]
+        entries_address = keys.entries_address(keys_header["dk_log2_index_bytes"])
+
+        if header["ma_values"] == 0:
+            # Deleted entries have a NULL value; unused index slots never reach the entry table.
+            words = 3 if keys_header["dk_kind"] == DICT_KEYS_GENERAL else 2
+            table = array("Q", backend.read(entries_address, nentries * words * 8))
+            for key, value in zip(table[words - 2::words], table[words - 1::words]):
+                if value:
+                    yield key, value
+        else:
+            # Split table: ma_values[-3 - i] holds the entry index of the i-th key in insertion order.
+            used = header["ma_used"]
+            values_address = header["ma_values"]
+            order = backend.read(values_address - 2 - used, used)
+            table = array("Q", backend.read(entries_address, nentries * 16))
+            values = array("Q", backend.read(values_address, (keys_header["dk_usable"] + nentries) * 8))
+            for index in reversed(order):
+                yield table[2 * index], values[index]
+
+    def items(self) -> Iterator[Tuple[PyObject, PyObject]]:
+        for key, value in self.item_addresses():
+            yield PyObject(key), PyObject(value)
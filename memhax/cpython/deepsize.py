@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+from array import array
+from typing import NamedTuple, Union, Iterable, Optional, Dict, List, Tuple
+
+from memhax.cpython.census import Py_TPFLAGS_MANAGED_DICT, Py_TPFLAGS_HEAPTYPE
+from memhax.cpython.collections import PyDictObject, PyDictKeysObject, PySetObject
+from memhax.cpython.heap import Py_TPFLAGS_HAVE_GC, PyGC_HEAD_SIZE
+from memhax.cpython.object import PyTypeObject, PyHeapTypeObject
+from memhax.cpython.primitives import PyASCIIObject, PyCompactUnicodeObject
+from memhax.native.structs import Struct
+from memhax.utils import get_backend
+
+__all__ = ("DeepSize", "TypeInfo", "TypeTable", "DEFAULT_CUT", "deep_sizeof")
+
+Py_TPFLAGS_LIST_SUBCLASS = 1 << 25
+Py_TPFLAGS_TUPLE_SUBCLASS = 1 << 26
+Py_TPFLAGS_UNICODE_SUBCLASS = 1 << 28
+Py_TPFLAGS_DICT_SUBCLASS = 1 << 29
+
+# Objects of these types, or of their subclasses, are sized but their references are not followed.
+DEFAULT_CUT = ("type", "module")
+
+_OTHER, _TUPLE, _LIST, _DICT, _SET, _STR = range(6)
+# Managed dict objects keep the values and dict pointers in the two words before the PyGC_Head.
+_MANAGED_DICT_SIZE = 16
+# Objects whose headers are read with one read_many call.
+_BATCH = 4096
+_ASCII_SIZE = PyASCIIObject.sizeof()
+_COMPACT_SIZE = PyCompactUnicodeObject.sizeof()
+_SET_MASK = PySetObject.offsetof(PySetObject.mask)
+_SMALLTABLE = PySetObject.offsetof(PySetObject.smalltable)
+
+
+class DeepSize(NamedTuple):
+    # Bytes owned by the object itself: pre-header, struct, items and private buffers such as a list's item array.
+    shallow: int
+    # Every object reachable from it, each counted once.
+    reachable: int
+    # What freeing it would free: reachable objects with no references from outside the graph.
+    retained: int
+    objects: int
+    # False when max_objects cut the walk short.
+    complete: bool
+
+
+class TypeInfo(NamedTuple):
+    basicsize: int
+    itemsize: int
+    flags: int
+    dictoffset: int
+    kind: int
+    cut: bool
+    # GC head and managed dict pointers in front of the object.
+    presize: int
+    # Plain objects without references this walk follows.
+    leaf: bool
+    # Capacity of the values array of instances with a managed __dict__.
+    values_capacity: int
+
+
+class TypeTable:
+    # Layout facts of each type object, read once, and how instances of each type are sized and expanded.
+    def __init__(self, cut: Iterable[Union[str, type, PyTypeObject, int]]):
+        self.cut_names = set()
+        self.cut_types = set()
+        for entry in cut:
+            if isinstance(entry, str):
+                self.cut_names.add(entry)
+            elif isinstance(entry, int):
+                self.cut_types.add(entry)
+            elif isinstance(entry, PyTypeObject):
+                self.cut_types.add(entry.address)
+            else:
+                self.cut_types.add(id(entry))
+        self._types: Dict[int, TypeInfo] = {}
+        self._names: Dict[int, str] = {}
+
+    def name(self, address: int) -> str:
+        name = self._names.get(address)
+        if name is None:
+            name = self._names[address] = PyTypeObject(address).tp_name().get()
+        return name
+
+    def info(self, address: int) -> TypeInfo:
+        info = self._types.get(address)
+        if info is not None:
+            return info
+        fields = PyTypeObject(address).snapshot()
+        flags = fields["tp_flags"]
+        # Cut and set membership follow tp_base, so subclasses are covered too.
+        kind = _OTHER
+        cut = False
+        base = address
+        while base:
+            name = self.name(base)
+            cut = cut or base in self.cut_types or name in self.cut_names
+            if kind == _OTHER and name in ("set", "frozenset"):
+                kind = _SET
+            base = PyTypeObject(base).tp_base.raw()
+        if flags & Py_TPFLAGS_TUPLE_SUBCLASS:
+            kind = _TUPLE
+        elif flags & Py_TPFLAGS_LIST_SUBCLASS:
+            kind = _LIST
+        elif flags & Py_TPFLAGS_DICT_SUBCLASS:
+            kind = _DICT
+        elif flags & Py_TPFLAGS_UNICODE_SUBCLASS:
+            kind = _STR
+        capacity = 0
+        if flags & Py_TPFLAGS_MANAGED_DICT and flags & Py_TPFLAGS_HEAPTYPE:
+            keys = PyHeapTypeObject(address).ht_cached_keys.raw()
+            if keys:
+                header = PyDictKeysObject(keys).snapshot()
+                capacity = header["dk_usable"] + header["dk_nentries"]
+        presize = (PyGC_HEAD_SIZE if flags & Py_TPFLAGS_HAVE_GC else 0) + (_MANAGED_DICT_SIZE if flags & Py_TPFLAGS_MANAGED_DICT else 0)
+        leaf = kind == _OTHER and not fields["tp_dictoffset"] and not flags & Py_TPFLAGS_MANAGED_DICT
+        info = self._types[address] = TypeInfo(fields["tp_basicsize"], fields["tp_itemsize"], flags, fields["tp_dictoffset"], kind, cut, presize, leaf, capacity)
+        return info
+
+    def expand(self, address: int, info: TypeInfo, ob_size: int, may_cut: bool) -> Tuple[int, List[int]]:
+        # (shallow size, referenced addresses) of one object; the root is always descended into.
+        backend = get_backend()
+        size = info.presize + info.basicsize + abs(ob_size) * info.itemsize
+        children: List[int] = []
+
+        if info.kind == _TUPLE:
+            if ob_size > 0:
+                children = list(array("Q", backend.read(address + 24, ob_size * 8)))
+        elif info.kind == _LIST:
+            ob_item, allocated = backend.unpack("@Pq", address + 24)
+            size += allocated * 8
+            if ob_item and ob_size > 0:
+                children = list(array("Q", backend.read(ob_item, ob_size * 8)))
+        elif info.kind == _DICT:
+            size, children = self._expand_dict(address, size)
+        elif info.kind == _SET:
+            mask, table = backend.unpack("@qP", address + _SET_MASK)
+            if table != address + _SMALLTABLE:
+                size += (mask + 1) * 16
+            children = list(PySetObject(address).key_addresses())
+        elif info.kind == _STR:
+            size = info.presize + self._str_size(address, info)
+
+        if info.flags & Py_TPFLAGS_MANAGED_DICT:
+            values, dict_ = backend.unpack("@PP", address - PyGC_HEAD_SIZE - _MANAGED_DICT_SIZE)
+            if dict_:
+                children.append(dict_)
+            elif values and info.values_capacity:
+                # Attributes live in a values array until a __dict__ is requested; see PyDictObject.item_addresses.
+                prefix = backend.read(values - 1, 1)[0]
+                used = backend.read(values - 2, 1)[0]
+                order = backend.read(values - 2 - used, used)
+                slots = array("Q", backend.read(values, info.values_capacity * 8))
+                size += prefix + info.values_capacity * 8
+                children.extend(slots[index] for index in order)
+        elif info.dictoffset:
+            offset = info.dictoffset
+            if offset < 0:
+                # Relative to the end of a variable-size object, as in _PyObject_GetDictPtr.
+                offset += (info.basicsize + abs(ob_size) * info.itemsize + 7) & ~7
+            children.append(backend.unpack("@P", address + offset)[0])
+
+        if info.cut and may_cut:
+            return size, []
+        return size, children
+
+    @staticmethod
+    def _expand_dict(address: int, size: int) -> Tuple[int, List[int]]:
+        # Sized as in _PyDict_SizeOf: split values, plus the keys object when this dict is its only user.
+        header = PyDictObject(address).snapshot()
+        keys = PyDictKeysObject(header["ma_keys"])
+        keys_header = keys.snapshot()
+        split = bool(header["ma_values"])
+        if split:
+            size += (keys_header["dk_usable"] + keys_header["dk_nentries"]) * 8
+        if keys_header["dk_refcnt"] == 1:
+            size += keys.sizeof(keys)
+        children = []
+        for key, value in PyDictObject(address).item_addresses():
+            # Shared keys are referenced by the keys object, not by the dict.
+            if not split:
+                children.append(key)
+            children.append(value)
+        return size, children
+
+    @staticmethod
+    def _str_size(address: int, info: TypeInfo) -> int:
+        # Sized as in unicode_sizeof: compact strings store their characters inline, plus any cached UTF-8 and wchar_t copies.
+        backend = get_backend()
+        length, _, state, wstr = backend.unpack("@qqIxxxxP", address + 16)
+        kind = (state >> 2) & 0b111
+        compact = (state >> 5) & 0b1
+        ascii_ = (state >> 6) & 0b1
+        if compact and ascii_:
+            size = _ASCII_SIZE + length + 1
+            wstr_length = length
+        else:
+            utf8_length, utf8, wstr_length = backend.unpack("@qPq", address + _ASCII_SIZE)
+            size = _COMPACT_SIZE + (length + 1) * kind if compact else info.basicsize
+            if utf8 and utf8 != address + _COMPACT_SIZE:
+                size += utf8_length + 1
+        if wstr and kind != 4:
+            size += (wstr_length + 1) * 4
+        return size
+
+
+class _ObjectGraph:
+    # Nodes are numbered in discovery order; edges are stored per node, in node order, as node numbers.
+    def __init__(self, cut: Iterable[Union[str, type, PyTypeObject, int]]):
+        self.types = TypeTable(cut)
+        self.index: Dict[int, int] = {}
+        self.addresses = array("Q")
+        self.refcnts = array("q")
+        self.shallow = array("Q")
+        self.edge_start = array("Q", [0])
+        self.edges = array("I")
+        self.complete = True
+
+    def build(self, root: int, max_objects: Optional[int]) -> None:
+        backend = get_backend()
+        memory_map = backend.memory_map
+        table = self.types
+        index, addresses, edges, types = self.index, self.addresses, self.edges, table._types
+        add_refcnt, add_size, add_edge_start = self.refcnts.append, self.shallow.append, self.edge_start.append
+        limit = len(addresses) + (max_objects if max_objects is not None else 1 << 32)
+        index[root] = 0
+        addresses.append(root)
+        region = None
+        done = 0
+        # Breadth-first: the nodes after `done` are the queue, so the walk needs no stack.
+        while done < len(addresses):
+            batch = addresses[done:done + _BATCH]
+            # ob_refcnt, ob_type and ob_size of the whole batch.
+            words = array("q", b"".join(backend.read_many([(address, 24) for address in batch])))
+            for position, address in enumerate(batch):
+                refcnt, ob_type, ob_size = words[3 * position:3 * position + 3]
+                info = types.get(ob_type) or table.info(ob_type)
+                add_refcnt(refcnt)
+                if info.leaf:
+                    add_size(info.presize + info.basicsize + abs(ob_size) * info.itemsize)
+                    add_edge_start(len(edges))
+                    continue
+                size, children = table.expand(address, info, ob_size, address != root)
+                add_size(size)
+                for child in children:
+                    node = index.get(child)
+                    if node is None:
+                        if not child or child & 7:
+                            continue
+                        # Neighbouring objects mostly share a mapping, so the last one is checked first.
+                        if region is None or not region.start <= child < region.end:
+                            region = memory_map.find(child)
+                            if region is None or not region.readable:
+                                region = None
+                                continue
+                        if len(addresses) >= limit:
+                            self.complete = False
+                            continue
+                        node = index[child] = len(addresses)
+                        addresses.append(child)
+                    edges.append(node)
+                add_edge_start(len(edges))
+            done += len(batch)
+
+    def sizes(self) -> DeepSize:
+        # Retained size as the cycle collector would see it once the root loses its outside references:
+        # subtract the references held inside the graph, keep everything still referenced from outside and what it reaches.
+        count = len(self.addresses)
+        outside = array("q", self.refcnts)
+        for node in self.edges:
+            outside[node] -= 1
+        outside[0] = 0
+        alive = bytearray(count)
+        stack = [node for node in range(1, count) if outside[node] > 0]
+        for node in stack:
+            alive[node] = 1
+        edges, edge_start = self.edges, self.edge_start
+        while stack:
+            node = stack.pop()
+            for child in edges[edge_start[node]:edge_start[node + 1]]:
+                if not alive[child] and child:
+                    alive[child] = 1
+                    stack.append(child)
+        sizes = self.shallow
+        retained = sum(sizes[node] for node in range(count) if not alive[node])
+        return DeepSize(sizes[0], sum(sizes), retained, count, self.complete)
+
+
+def deep_sizeof(obj: Union[int, Struct], cut: Iterable[Union[str, type, PyTypeObject, int]] = DEFAULT_CUT, max_objects: Optional[int] = None) -> DeepSize:
+    # Follows tuple and list items, dict keys and values, set keys and instance __dict__s; other references are not traversed.
+    # cut holds type names, types or type addresses whose instances (and subclass instances) are not descended into.
+    graph = _ObjectGraph(cut)
+    graph.build(obj if isinstance(obj, int) else obj.address, max_objects)
+    # The address table is only needed while discovering nodes.
+    graph.index.clear()
+    return graph.sizes()
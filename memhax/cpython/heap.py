@@ -0,0 +1,154 @@
+from struct import pack
+from typing import Union, List, Optional, Type, Dict
+
+from memhax.cpython.collections import PyTupleObject, PyListObject, PyDictObject, PySetObject
+from memhax.cpython.object import PyObject, PyVarObject, PyTypeObject
+from memhax.cpython.primitives import PyLongObject, PyFloatObject, PyBytesObject, PyUnicodeObject
+from memhax.maps import MemoryMap
+from memhax.native.structs import Struct
+from memhax.scanner import Signature, find_signature
+from memhax.utils import get_backend
+
+__all__ = ("STRUCTS", "find_instances", "instances")
+
+Py_TPFLAGS_HAVE_GC = 1 << 14
+PyGC_HEAD_SIZE = 16
+# Anything above these is not a refcount or item count but a pointer or garbage.
+_MAX_REFCNT = 1 << 40
+_MAX_ITEMS = 1 << 40
+_MIN_POINTER = 0x1000
+_MAX_POINTER = 1 << 48
+
+# Struct to wrap instances in, by tp_name.
+STRUCTS: Dict[str, Type[Struct]] = {
+    "int": PyLongObject,
+    "bool": PyLongObject,
+    "float": PyFloatObject,
+    "bytes": PyBytesObject,
+    "str": PyUnicodeObject,
+    "tuple": PyTupleObject,
+    "list": PyListObject,
+    "dict": PyDictObject,
+    "set": PySetObject,
+    "frozenset": PySetObject,
+    "type": PyTypeObject,
+}
+
+
+def _type_object(cls: Union[type, PyTypeObject, int]) -> PyTypeObject:
+    if isinstance(cls, PyTypeObject):
+        return cls
+    if isinstance(cls, int):
+        return PyTypeObject(cls)
+    if not get_backend().local:
+        raise TypeError("Pass a PyTypeObject or type address when inspecting another process")
+    return PyTypeObject(id(cls))
+
+
+def _gc_pointer(memory_map: MemoryMap, value: int) -> bool:
+    if value % 8 or not _MIN_POINTER <= value < _MAX_POINTER:
+        return False
+    region = memory_map.find(value, refresh=False)
+    return region is not None and region.readable
+
+
+def _gc_link(memory_map: MemoryMap, gc_next: int, gc_prev: int) -> Optional[int]:
+    # The header a tracked object's _gc_prev points at, 0 for an untracked object, or None if the words are not a
+    # PyGC_Head. _gc_next has no flag bits outside a collection; _gc_prev keeps flags in its low two bits.
+    gc_prev &= ~3
+    if gc_next == 0:
+        return 0 if gc_prev == 0 else None
+    if _gc_pointer(memory_map, gc_next) and _gc_pointer(memory_map, gc_prev):
+        return gc_prev
+    return None
+
+
+def _validate(type_object: PyTypeObject, candidates: List[int]) -> List[int]:
+    info = type_object.snapshot()
+    basicsize, itemsize = info["tp_basicsize"], info["tp_itemsize"]
+    gc = bool(info["tp_flags"] & Py_TPFLAGS_HAVE_GC)
+    backend = get_backend()
+    memory_map = backend.memory_map
+    # Refcounts are probed as pointers below without refreshing on every miss.
+    memory_map.refresh()
+    before = PyGC_HEAD_SIZE if gc else 0
+    header = before + PyVarObject.sizeof()
+
+    # One batched read covering the GC head and the PyVarObject header of every readable candidate.
+    spans = []
+    for address in candidates:
+        region = memory_map.find(address - before)
+        if region is not None and region.readable and address - before + header <= region.end:
+            spans.append((address, region.end))
+    # The headers hold the type pointer, so they are read into one buffer that is zeroed afterwards
+    # rather than left in freed memory for the next scan to find.
+    buffer = bytearray(len(spans) * header)
+    backend.readinto_many([(address - before, header) for address, _ in spans], buffer)
+    words = memoryview(buffer).cast("q")
+    stride = header // 8
+    first = before // 8
+    found = []
+    links = []
+    try:
+        for index, (address, end) in enumerate(spans):
+            base = index * stride
+            if gc:
+                gc_prev = _gc_link(memory_map, words[base], words[base + 1])
+                if gc_prev is None:
+                    continue
+            refcnt, ob_size = words[base + first], words[base + first + 2]
+            if not 0 < refcnt < _MAX_REFCNT:
+                continue
+            # A "refcount" that points into mapped memory is the previous slot of a pointer array (a tuple, a dict entry).
+            if refcnt >= _MIN_POINTER and refcnt % 8 == 0 and memory_map.find(refcnt, refresh=False) is not None:
+                continue
+            size = basicsize
+            if itemsize:
+                # Negative sizes encode the sign of ints.
+                if abs(ob_size) >= _MAX_ITEMS:
+                    continue
+                size += abs(ob_size) * itemsize
+            if address + size > end and not memory_map.readable(address, size):
+                continue
+            found.append(address)
+            if gc:
+                links.append(gc_prev)
+    finally:
+        words.release()
+        buffer[:] = bytes(len(buffer))
+    if gc:
+        found = _linked(found, links, before)
+    return found
+
+
+def _linked(found: List[int], links: List[int], before: int) -> List[int]:
+    # A tracked object is only real if the header before it in its GC list links forward to it again.
+    tracked = [(address, gc_prev) for address, gc_prev in zip(found, links) if gc_prev]
+    buffer = bytearray(len(tracked) * 8)
+    get_backend().readinto_many([(gc_prev, 8) for _, gc_prev in tracked], buffer)
+    words = memoryview(buffer).cast("q")
+    try:
+        broken = {address for index, (address, _) in enumerate(tracked) if words[index] != address - before}
+    finally:
+        words.release()
+        buffer[:] = bytes(len(buffer))
+    return [address for address in found if address not in broken]
+
+
+def find_instances(cls: Union[type, PyTypeObject, int], validate: bool = True) -> List[int]:
+    # Addresses of every object whose ob_type points at cls, including objects the GC does not track.
+    type_object = _type_object(cls)
+    # Only match addresses are kept, so no copies of the type pointer are left around for the next scan to find.
+    found = find_signature(Signature.from_bytes(pack("@P", type_object.address)), alignment=8)
+    offset = PyObject.offsetof(PyObject.ob_type)
+    candidates = [address - offset for address in found]
+    if not validate:
+        return candidates
+    return _validate(type_object, candidates)
+
+
+def instances(cls: Union[type, PyTypeObject, int], struct_type: Optional[Type[Struct]] = None) -> List[Struct]:
+    type_object = _type_object(cls)
+    if struct_type is None:
+        struct_type = STRUCTS.get(type_object.tp_name().get(), PyObject)
+    return [struct_type(address) for address in find_instances(type_object)]
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from typing import List
+from array import array
+from ctypes import py_object, cast
+from typing import List, Sequence
 
 from memhax.cpython.type_attributes import PyAsyncMethods, PyNumberMethods, PySequenceMethods, PyMappingMethods, PyBufferProcs, PyMethodDef, PyMemberDef, \
     PyGetSetDef
 from memhax.native.structs import Struct
 from memhax.native.native import Py_ssize_t, UnsignedInteger
 from memhax.native.native_complex import Pointer, NullTerminatedArray, NullTerminatedString
+from memhax.utils import get_backend, CONFIG
 
 
 class PyObject(Struct[object]):
@@ -20,17 +23,28 @@ class PyObject(Struct[object]):
         self.ob_refcnt(self.ob_refcnt() - 1)
 
     def _reinterpret(self) -> object:
-        from memhax.cpython.collections import PyTupleObject
-        tup = (None,)
-        _tuple = PyTupleObject(id(tup))
-        _tuple.ob_item[0]().decref()
-        _tuple.ob_item[0].raw(self.address)
-        self.incref()
-        return tup[0]
+        if not get_backend().local:
+            raise RuntimeError("Cannot reinterpret an object from another process")
+        # py_object.value takes a new reference, so nothing needs to be written to memory.
+        return cast(self.address, py_object).value
 
     def get(self) -> object:
         return self._reinterpret()
 
+    @classmethod
+    def get_many(cls, instances: Sequence[PyObject]) -> List[object]:
+        return reinterpret_many([instance.address for instance in instances])
+
+
+def reinterpret_many(addresses: Sequence[int]) -> List[object]:
+    # The addresses are viewed as a PyObject* array; reading each item takes one new reference.
+    if not get_backend().local:
+        raise RuntimeError("Cannot reinterpret an object from another process")
+    words = array("Q", addresses)
+    if not words:
+        return []
+    return (py_object * len(words)).from_buffer(words)[:]
+
 
 class PyVarObject(PyObject):
     ob_size: Py_ssize_t
@@ -86,5 +100,28 @@ class PyTypeObject(PyVarObject, Struct[type]):
     tp_finalize: Pointer
     tp_vectorcall: Pointer
 
+    def repr_children(self):
+        # Types print as their class in simplified mode instead of their slots.
+        if CONFIG["simplified_repr"]:
+            return None
+        return super().repr_children()
+
     def repr_simple(self, visited: List[int]) -> str:
+        if not get_backend().local:
+            return f"<class '{self.tp_name().get()}'>"
         return repr(self.get())
+
+
+class PyHeapTypeObject(PyTypeObject):
+    as_async: PyAsyncMethods
+    as_number: PyNumberMethods
+    as_mapping: PyMappingMethods
+    as_sequence: PySequenceMethods
+    as_buffer: PyBufferProcs
+    ht_name: Pointer[PyObject]
+    ht_slots: Pointer[PyObject]
+    ht_qualname: Pointer[PyObject]
+    ht_cached_keys: Pointer  # PyDictKeysObject shared by instances with a managed __dict__
+    ht_module: Pointer[PyObject]
+    _ht_tpname: Pointer[NullTerminatedString]
+    _spec_cache_getitem: Pointer[PyObject]
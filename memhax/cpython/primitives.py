@@ -12,7 +12,7 @@ class PyLongObject(PyVarObject, Struct[int]):
     ob_digit: PropertySizeArray[uint32_t, lambda self: abs(self.ob_size())]
 
 
-class PyFloatObject(PyVarObject, Struct[float]):
+class PyFloatObject(PyObject, Struct[float]):
     ob_fval: Double
 
 
@@ -30,7 +30,7 @@ class PyASCIIObject(PyObject, Struct[str]):
     def _string(self, interned: int, kind: int, compact: bool, _ascii: bool, ready: bool) -> str:
         if not (kind == 1 and compact and _ascii and ready):
             raise ValueError("Not a PyASCIIObject valid string:", interned, kind, compact, _ascii, ready)
-        addr = self.address + PyASCIIObject.offset_after(self.wstr)
+        addr = self.address + PyASCIIObject.layout.offset_after("wstr")
         with memory(addr) as mem:
             data = mem.read(self.length())
             return data.decode("ascii")
@@ -54,7 +54,7 @@ class PyCompactUnicodeObject(PyASCIIObject):
         if kind == 1 and compact and _ascii and ready:
             return super()._string(interned, kind, compact, _ascii, ready)
         if kind != 0 and compact and not _ascii and ready:
-            addr = self.address + PyCompactUnicodeObject.offset_after(PyCompactUnicodeObject.wstr_length)
+            addr = self.address + PyCompactUnicodeObject.layout.offset_after("wstr_length")
             with memory(addr) as mem:
                 data = mem.read(self.length() * kind)
                 fmt = {
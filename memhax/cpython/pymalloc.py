@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+from array import array
+from typing import Optional, Sequence, List, Iterator, Tuple, NamedTuple, Dict, Any
+
+from memhax.maps import Region
+from memhax.native.native import UnsignedInteger, UnsignedLongLong
+from memhax.native.native_complex import Pointer
+from memhax.native.structs import Struct
+from memhax.utils import get_backend
+
+__all__ = ("pool_header", "arena_object", "PymallocHeap", "SizeClassStats")
+
+# Objects/obmalloc.c on 64-bit 3.11 builds (WITH_PYMALLOC_RADIX_TREE)
+ALIGNMENT = 16
+SMALL_REQUEST_THRESHOLD = 512
+NB_SMALL_SIZE_CLASSES = SMALL_REQUEST_THRESHOLD // ALIGNMENT
+POOL_SIZE = 1 << 14
+ARENA_SIZE = 1 << 20
+INITIAL_ARENA_OBJECTS = 16
+_POOL_MASK = POOL_SIZE - 1
+
+
+class pool_header(Struct[None]):
+    count: UnsignedInteger  # union { block *_padding; uint count; } ref
+    freeblock: Pointer
+    nextpool: Pointer[pool_header]
+    prevpool: Pointer[pool_header]
+    arenaindex: UnsignedInteger
+    szidx: UnsignedInteger
+    nextoffset: UnsignedInteger
+    maxnextoffset: UnsignedInteger
+
+
+class arena_object(Struct[None]):
+    address: UnsignedLongLong
+    pool_address: Pointer
+    nfreepools: UnsignedInteger
+    ntotalpools: UnsignedInteger
+    freepools: Pointer[pool_header]
+    nextarena: Pointer[arena_object]
+    prevarena: Pointer[arena_object]
+
+
+POOL_OVERHEAD = (pool_header.sizeof() + ALIGNMENT - 1) & ~(ALIGNMENT - 1)
+
+
+def block_size(szidx: int) -> int:
+    return (szidx + 1) * ALIGNMENT
+
+
+def _valid_pool(header: Dict[str, Any]) -> bool:
+    # A live pool's offsets are fully determined by its size class.
+    if not 0 < header["count"] or not header["szidx"] < NB_SMALL_SIZE_CLASSES:
+        return False
+    size = block_size(header["szidx"])
+    return header["maxnextoffset"] == POOL_SIZE - size and POOL_OVERHEAD < header["nextoffset"] <= POOL_SIZE
+
+
+def _valid_arenas(arenas: int, count: int) -> bool:
+    # Arenas that own memory stay within their 1 MiB; those with free pools are linked through usable_arenas, and
+    # entries without memory through unused_arena_objects, so those links stay inside the array. Only the last entry
+    # of the unused list has no successor. Full arenas are on no list and keep stale links.
+    layout = arena_object.layout
+    data = get_backend().read(arenas, count * layout.stride)
+    end = arenas + count * layout.stride
+    tails = 0
+    for offset in range(0, len(data), layout.stride):
+        fields = layout.decode(layout.format.unpack_from(data, offset))
+        links = [fields["nextarena"]]
+        if fields["address"]:
+            if not fields["address"] <= fields["pool_address"] <= fields["address"] + ARENA_SIZE \
+                    or not fields["nfreepools"] <= fields["ntotalpools"] <= ARENA_SIZE // POOL_SIZE:
+                return False
+            if not fields["nfreepools"]:
+                continue
+            links.append(fields["prevarena"])
+        elif not fields["nextarena"]:
+            tails += 1
+        if tails > 1 or any(link and not (arenas <= link < end and (link - arenas) % layout.stride == 0) for link in links):
+            return False
+    return True
+
+
+class SizeClassStats(NamedTuple):
+    szidx: int
+    block_size: int
+    pools: int
+    used_blocks: int
+    free_blocks: int
+    # Share of the pools' block capacity holding live blocks.
+    utilization: float
+
+
+class PymallocHeap:
+    def __init__(self, usedpools: int, arenas: int, maxarenas: int, arenas_slot: Optional[int] = None):
+        self.usedpools = usedpools
+        self.arenas = arenas
+        self.maxarenas = maxarenas
+        # Address of the static `arenas` pointer; the array is reallocated whenever it grows.
+        self.arenas_slot = arenas_slot
+
+    # Discovery: obmalloc.c keeps usedpools and arenas in static variables without exported symbols.
+
+    @classmethod
+    def discover(cls, samples: Optional[Sequence[int]] = None) -> PymallocHeap:
+        # samples are addresses of small live objects; in this process fresh allocations are used.
+        keepalive = None
+        if samples is None:
+            if not get_backend().local:
+                raise ValueError("Pass addresses of small objects when inspecting another process")
+            keepalive = [bytes(size) for size in range(1, SMALL_REQUEST_THRESHOLD - 64, 24)]
+            samples = [id(item) for item in keepalive]
+        pools = [address & ~_POOL_MASK for address in samples]
+        headers = pool_header.values_many([pool_header(pool) for pool in pools])
+        pools = [(pool, header) for pool, header in zip(pools, headers) if _valid_pool(header)]
+        if not pools:
+            raise ValueError("None of the sample addresses is inside a pymalloc pool")
+        usedpools = cls._find_usedpools(pools)
+        arenas_slot, arenas, maxarenas = cls._find_arenas(usedpools, pools)
+        del keepalive
+        return cls(usedpools, arenas, maxarenas, arenas_slot)
+
+    @staticmethod
+    def _find_usedpools(pools: List[Tuple[int, Dict[str, Any]]]) -> int:
+        # Partially used pools form a ring through a pseudo-pool inside usedpools: the one node that is not pool-aligned.
+        # usedpools[2 * szidx] sits at pseudo-pool + 16, so every ring gives the same array base.
+        found: Dict[int, int] = {}
+        for pool, header in pools:
+            node = header["nextpool"]
+            for _ in range(1 << 16):
+                if node & _POOL_MASK or node == 0:
+                    break
+                node = pool_header(node).nextpool.raw()
+            if node and node & _POOL_MASK:
+                base = node + 2 * 8 - 2 * 8 * header["szidx"]
+                found[base] = found.get(base, 0) + 1
+        if not found:
+            raise ValueError("Could not locate usedpools")
+        return max(found, key=found.get)
+
+    @staticmethod
+    def _static_regions(usedpools: int) -> List[Region]:
+        # The writable mappings of the binary holding usedpools: .data, then the anonymous mapping with .bss.
+        regions = list(get_backend().memory_map.regions())
+        index = next(index for index, region in enumerate(regions) if region.start <= usedpools < region.end)
+        found = [regions[index]]
+        for region in regions[index + 1:]:
+            if region.start != found[-1].end or region.path not in ("", found[0].path) or not region.writable:
+                break
+            found.append(region)
+            if not region.path:
+                break
+        return found
+
+    @staticmethod
+    def _find_arenas(usedpools: int, pools: List[Tuple[int, Dict[str, Any]]]) -> Tuple[int, int, int]:
+        # `arenas` is a static pointer next to usedpools; the right one maps every sample pool's arenaindex
+        # to an arena_object whose 1 MiB range holds that pool.
+        backend = get_backend()
+        memory_map = backend.memory_map
+        # Most words are not pointers, so the map is refreshed once rather than on every miss.
+        memory_map.refresh()
+        stride = arena_object.sizeof()
+        highest = max(header["arenaindex"] for _, header in pools)
+        first_pool, first_header = pools[0]
+        for region in PymallocHeap._static_regions(usedpools):
+            for index, word in enumerate(array("Q", backend.read(region.start, region.size))):
+                if word & 0xF or not word:
+                    continue
+                # The whole array is one allocation, so every entry lies in the mapping the pointer starts in.
+                target = memory_map.find(word, refresh=False)
+                if target is None or not target.readable or word + (highest + 1) * stride > target.end:
+                    continue
+                address = backend.unpack("@Q", word + first_header["arenaindex"] * stride)[0]
+                if not address <= first_pool < address + ARENA_SIZE:
+                    continue
+                entries = [(word + header["arenaindex"] * stride, pool) for pool, header in pools]
+                addresses = [int.from_bytes(data, "little") for data in backend.read_many([(entry, 8) for entry, _ in entries])]
+                if all(address <= pool < address + ARENA_SIZE for address, (_, pool) in zip(addresses, entries)):
+                    return region.start + index * 8, word, PymallocHeap._maxarenas(word, highest)
+        raise ValueError("Could not locate the arenas array")
+
+    @staticmethod
+    def _maxarenas(arenas: int, highest: int) -> int:
+        # maxarenas doubles from INITIAL_ARENA_OBJECTS but is not exported, and the array's malloc chunk says nothing
+        # portable about its size. It is the largest such count whose entries all read as arena_objects: past the
+        # array, heap data or zeroed memory breaks the links of the unused list.
+        memory_map = get_backend().memory_map
+        region = memory_map.find(arenas)
+        end = region.end if region is not None and region.readable else arenas
+        found = None
+        count = INITIAL_ARENA_OBJECTS
+        while arenas + count * arena_object.sizeof() <= end:
+            if count > highest:
+                if not _valid_arenas(arenas, count):
+                    break
+                found = count
+            count *= 2
+        if found is None:
+            raise ValueError("Could not determine the size of the arenas array")
+        return found
+
+    # Enumeration
+
+    def refresh(self) -> None:
+        # Follows the arenas array after it was reallocated to hold more arenas.
+        if self.arenas_slot is None:
+            return
+        arenas = get_backend().unpack("@P", self.arenas_slot)[0]
+        if arenas != self.arenas:
+            self.maxarenas = self._maxarenas(arenas, self.maxarenas - 1)
+            self.arenas = arenas
+
+    def arena_objects(self) -> List[Tuple[int, Dict[str, Any]]]:
+        # (address, fields) of every arena that currently owns memory, from one read of the array.
+        layout = arena_object.layout
+        data = get_backend().read(self.arenas, self.maxarenas * layout.stride)
+        arenas = []
+        for index in range(self.maxarenas):
+            fields = layout.decode(layout.format.unpack_from(data, index * layout.stride))
+            if fields["address"]:
+                arenas.append((self.arenas + index * layout.stride, fields))
+        return arenas
+
+    def pools(self) -> Iterator[Tuple[int, Dict[str, Any], bytes]]:
+        # (address, header, contents) of every pool in use; each arena's carved pools are read at once.
+        for _, arena in self.arena_objects():
+            yield from self.arena_pools(arena)
+
+    @staticmethod
+    def arena_pools(arena: Dict[str, Any]) -> Iterator[Tuple[int, Dict[str, Any], bytes]]:
+        layout = pool_header.layout
+        first = (arena["address"] + _POOL_MASK) & ~_POOL_MASK
+        carved = arena["pool_address"] - first
+        if not 0 < carved <= ARENA_SIZE:
+            return
+        data = get_backend().read(first, carved)
+        for offset in range(0, carved - POOL_SIZE + 1, POOL_SIZE):
+            header = layout.decode(layout.format.unpack_from(data, offset))
+            if _valid_pool(header):
+                yield first + offset, header, data[offset:offset + POOL_SIZE]
+
+    @staticmethod
+    def allocated(pool: int, header: Dict[str, Any], data: bytes) -> List[int]:
+        size = block_size(header["szidx"])
+        free = set()
+        block = header["freeblock"]
+        # Free blocks are chained through their first word; stop on anything outside the pool.
+        while block and pool <= block < pool + POOL_SIZE and block not in free and len(free) < POOL_SIZE // size:
+            free.add(block)
+            block = int.from_bytes(data[block - pool:block - pool + 8], "little")
+        return [pool + offset for offset in range(POOL_OVERHEAD, header["nextoffset"], size) if pool + offset not in free]
+
+    def blocks(self, szidx: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+        # (size class, address) of every allocated block.
+        for pool, header, data in self.pools():
+            if szidx is None or header["szidx"] == szidx:
+                for block in self.allocated(pool, header, data):
+                    yield header["szidx"], block
+
+    def partial_pools(self, szidx: int) -> Iterator[int]:
+        # The usedpools ring of one size class: pools that still have room.
+        head = self.usedpools + 2 * 8 * szidx - 2 * 8
+        node = get_backend().unpack("@P", self.usedpools + 2 * 8 * szidx)[0]
+        while node != head and node:
+            yield node
+            node = pool_header(node).nextpool.raw()
+
+    def stats(self) -> List[SizeClassStats]:
+        pools = [0] * NB_SMALL_SIZE_CLASSES
+        used = [0] * NB_SMALL_SIZE_CLASSES
+        for pool, header, data in self.pools():
+            pools[header["szidx"]] += 1
+            used[header["szidx"]] += len(self.allocated(pool, header, data))
+        stats = []
+        for szidx in range(NB_SMALL_SIZE_CLASSES):
+            capacity = pools[szidx] * ((POOL_SIZE - POOL_OVERHEAD) // block_size(szidx))
+            stats.append(SizeClassStats(szidx, block_size(szidx), pools[szidx], used[szidx], capacity - used[szidx], used[szidx] / capacity if capacity else 0.0))
+        return stats
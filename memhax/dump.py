@@ -0,0 +1,239 @@
+import json
+import os
+from contextlib import contextmanager
+from array import array
+from mmap import mmap, ACCESS_READ
+from shutil import copyfileobj
+from struct import Struct as _CompiledFormat
+from tempfile import TemporaryFile
+from typing import NamedTuple, Any, Dict, List, Optional, Iterator, Union, IO, Tuple
+
+from memhax.cpython.deepsize import DEFAULT_CUT, TypeTable
+from memhax.cpython.heap import STRUCTS
+from memhax.cpython.object import PyObject
+from memhax.native.structs import Struct
+from memhax.utils import get_backend
+from memhax.walker import Visitor, iter_walk
+
+__all__ = ("DumpRecord", "iter_records", "dump_jsonl", "dump_binary", "HeapDump")
+
+# Binary layout: header, then one fixed-width node per record, then the edge table, then type names.
+_MAGIC = b"MHXDUMP1"
+_HEADER = _CompiledFormat("@8s4Q")  # magic, node count, edge count, edge table offset, type table offset
+_NODE = _CompiledFormat("@5Q")  # address, size, first edge, edge count, type id
+_NODE_WORDS = 5
+_EDGE = _CompiledFormat("@Q")
+
+
+class DumpRecord(NamedTuple):
+    address: int
+    type: str
+    size: int
+    fields: Dict[str, Any]
+    pointers: List[int]
+
+
+class _DumpVisitor(Visitor):
+    # Python objects (structs with an ob_type) are dumped by their runtime type: they are wrapped in the struct for
+    # their tp_name, sized and expanded with deep_sizeof's type table, so generic PyObject pointers lose nothing.
+    # Other structs are walked by their fields, and every pointer target becomes a record.
+    def __init__(self, follow_types: bool):
+        self.follow_types = follow_types
+        self.ready: List[DumpRecord] = []
+        self._types = TypeTable(("module",) if follow_types else DEFAULT_CUT)
+        self._memory_map = get_backend().memory_map
+        # Per entered element: whether it is a record, and the references of a Python object (None for other elements).
+        self._frames: List[Tuple[bool, Optional[List[int]]]] = []
+        self._records: List[DumpRecord] = []
+        self._deref = False
+
+    def _object(self, element):
+        # The struct for the object's runtime type, or element itself if there is none more specific.
+        address = element.ob_type.raw()
+        if not self._memory_map.readable(address):
+            return element
+        struct_type = STRUCTS.get(self._types.name(address))
+        return element if struct_type is None or isinstance(element, struct_type) else struct_type(element.address)
+
+    def enter(self, element, label: Optional[str], depth: int) -> bool:
+        # The root and every pointer target become records; fields and array items belong to their owner.
+        record = not self._frames or self._deref
+        references = None
+        if record:
+            if _is_object(element):
+                element = self._object(element)
+                ob_type = element.ob_type.raw()
+                info = self._types.info(ob_type)
+                ob_size = element.ob_size() if "ob_size" in element.__class__.layout else 0
+                # The object and its out-of-line storage (item arrays, hash tables, values), without the pre-header.
+                size, references = self._types.expand(element.address, info, ob_size, bool(self._frames))
+                size -= info.presize
+                name = self._types.name(ob_type)
+                if self.follow_types:
+                    references = [ob_type] + references
+            else:
+                size, name = element.sizeof(element), element.__class__.__name__
+            fields = element.snapshot() if isinstance(element, Struct) else {}
+            self._records.append(DumpRecord(element.address, name, size, fields, []))
+        self._frames.append((record, references))
+        return True
+
+    def children(self, element):
+        references = self._frames[-1][1]
+        if references is None:
+            edges = element.children()
+        else:
+            edges = ((None, PyObject(address), True) for address in references if self._valid(address))
+        for edge in edges:
+            label, child, deref = edge
+            if deref:
+                self._records[-1].pointers.append(child.address)
+            self._deref = deref
+            yield label, child, deref
+
+    def _valid(self, address: int) -> bool:
+        return address != 0 and not address & 7 and self._memory_map.readable(address, PyObject.sizeof())
+
+    def leave(self, element, label: Optional[str], depth: int) -> None:
+        record, _ = self._frames.pop()
+        if record:
+            self.ready.append(self._records.pop())
+
+
+def _is_object(element) -> bool:
+    return isinstance(element, Struct) and "ob_type" in element.__class__.layout
+
+
+def iter_records(root, max_depth: Optional[int] = None, max_nodes: Optional[int] = None, follow_types: bool = False) -> Iterator[DumpRecord]:
+    # Every element reachable from root, each pointer target once; records are yielded as soon as their subtree is done.
+    # Only the addresses already visited are kept, one set entry per record, so memory grows with the graph size.
+    visitor = _DumpVisitor(follow_types)
+    for _ in iter_walk(root, visitor, max_depth, max_nodes, unique=True):
+        if visitor.ready:
+            yield from visitor.ready
+            visitor.ready.clear()
+
+
+@contextmanager
+def _open(target: Union[str, os.PathLike, IO], mode: str):
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, mode) as fp:
+            yield fp
+    else:
+        yield target
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    raise TypeError(f"Cannot serialize {value.__class__.__name__}")
+
+
+def dump_jsonl(root, target: Union[str, os.PathLike, IO], max_depth: Optional[int] = None, max_nodes: Optional[int] = None, follow_types: bool = False) -> int:
+    count = 0
+    with _open(target, "w") as fp:
+        for record in iter_records(root, max_depth, max_nodes, follow_types):
+            fp.write(json.dumps(record._asdict(), default=_json_default))
+            fp.write("\n")
+            count += 1
+    return count
+
+
+def dump_binary(root, target: Union[str, os.PathLike, IO], max_depth: Optional[int] = None, max_nodes: Optional[int] = None, follow_types: bool = False) -> int:
+    # Field values are not stored; nodes keep address, size and type, edges keep the pointer targets.
+    # target must be seekable since the header is written last.
+    types: Dict[str, int] = {}
+    nodes = edges = 0
+    with _open(target, "wb") as fp, TemporaryFile() as edge_file:
+        start = fp.tell()
+        fp.write(bytes(_HEADER.size))
+        for record in iter_records(root, max_depth, max_nodes, follow_types):
+            type_id = types.setdefault(record.type, len(types))
+            fp.write(_NODE.pack(record.address, record.size, edges, len(record.pointers), type_id))
+            for pointer in record.pointers:
+                edge_file.write(_EDGE.pack(pointer))
+            edges += len(record.pointers)
+            nodes += 1
+
+        edge_offset = fp.tell() - start
+        edge_file.seek(0)
+        copyfileobj(edge_file, fp)
+        type_offset = fp.tell() - start
+        fp.write("\n".join(types).encode())
+        end = fp.tell()
+        fp.seek(start)
+        fp.write(_HEADER.pack(_MAGIC, nodes, edges, edge_offset, type_offset))
+        fp.seek(end)
+    return nodes
+
+
+class HeapDump:
+    def __init__(self, path: Union[str, os.PathLike]):
+        with open(path, "rb") as fp:
+            self._mmap = mmap(fp.fileno(), 0, access=ACCESS_READ)
+        magic, count, edge_count, edge_offset, type_offset = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a memhax heap dump")
+        view = memoryview(self._mmap)
+        self._nodes = view[_HEADER.size:_HEADER.size + count * _NODE.size].cast("Q")
+        self._edges = view[edge_offset:edge_offset + edge_count * _EDGE.size].cast("Q")
+        self.types = bytes(view[type_offset:]).decode().split("\n") if count else []
+        self._index: Optional[Dict[int, int]] = None
+        view.release()
+
+    # Columns of the node table. They are copied out of the file, so close() never finds views of it still exported.
+    @property
+    def addresses(self) -> array:
+        return array("Q", self._nodes[0::_NODE_WORDS])
+
+    @property
+    def sizes(self) -> array:
+        return array("Q", self._nodes[1::_NODE_WORDS])
+
+    @property
+    def type_ids(self) -> array:
+        return array("Q", self._nodes[4::_NODE_WORDS])
+
+    def pointers(self, index: int) -> array:
+        first, count = self._nodes[index * _NODE_WORDS + 2], self._nodes[index * _NODE_WORDS + 3]
+        return array("Q", self._edges[first:first + count])
+
+    def find(self, address: int) -> Optional[int]:
+        if self._index is None:
+            self._index = {address: index for index, address in enumerate(self.addresses)}
+        return self._index.get(address)
+
+    def to_numpy(self):
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("HeapDump.to_numpy() requires numpy") from None
+        dtype = np.dtype([("address", "u8"), ("size", "u8"), ("first_edge", "u8"), ("edge_count", "u8"), ("type_id", "u8")])
+        return np.frombuffer(self._nodes, dtype=dtype).copy()
+
+    def __len__(self) -> int:
+        return len(self._nodes) // _NODE_WORDS
+
+    def __getitem__(self, index: int) -> DumpRecord:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+        address, size, _, _, type_id = self._nodes[index * _NODE_WORDS:(index + 1) * _NODE_WORDS]
+        return DumpRecord(address, self.types[type_id], size, {}, self.pointers(index).tolist())
+
+    def __iter__(self) -> Iterator[DumpRecord]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self) -> None:
+        self._nodes.release()
+        self._edges.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
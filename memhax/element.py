@@ -1,14 +1,22 @@
 from __future__ import annotations
 
-from struct import calcsize, unpack, pack
-from typing import TypeVar, Self, Union, Optional, Generic, get_type_hints, Type, List
+from struct import calcsize
+from typing import TypeVar, Self, Union, Optional, Generic, get_type_hints, Type, List, Sequence, Any, Tuple, Iterable
 
-from memhax.utils import memory, CONFIG
+from memhax.backends import compiled_format
+from memhax.utils import get_backend
+from memhax.walker import render_repr
 
 T = TypeVar('T')
 
+_ARRAY_TYPECODES = "bBhHiIlLqQfd"
+_SIGNED_TYPECODES = {1: "b", 2: "h", 4: "i", 8: "q"}
+_UNSIGNED_TYPECODES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
 
 class Element(Generic[T]):
+    __slots__ = ("address", "__orig_class__")
+
     def __init__(self, address: int):
         self.address = address
 
@@ -36,12 +44,19 @@ class Element(Generic[T]):
     def typename(cls, complete_type: Optional[Type[Self]] = None) -> str:
         raise NotImplementedError(cls.__name__)
 
-    def repr_handler(self, visited: List[int]):
-        visited.append(self.address)
-        if CONFIG["simplified_repr"]:
-            return self.repr_simple(visited[:])
-        else:
-            return self.repr_rich(visited[:])
+    def children(self) -> Iterable[Tuple[Optional[str], Element, bool]]:
+        # Outgoing edges as (label, element, follows a pointer) for memhax.walker.
+        return ()
+
+    def repr_children(self) -> Optional[Iterable[Tuple[Optional[str], Element, bool]]]:
+        # None renders this element on its own through repr_simple/repr_rich.
+        return None
+
+    def repr_format(self, parts: List[Tuple[Optional[str], str]], rich: bool) -> str:
+        raise NotImplementedError(self.__class__.__name__)
+
+    def repr_handler(self, visited: Optional[List[int]] = None):
+        return render_repr(self)
 
     def repr_simple(self, visited: List[int]) -> str:
         return self.repr_rich(visited[:])
@@ -50,10 +65,12 @@ class Element(Generic[T]):
         return super().__repr__()
 
     def __repr__(self):
-        return self.repr_handler([])
+        return render_repr(self)
 
 
 class PackedElement(Element[T]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         raise NotImplementedError(cls.__name__)
@@ -67,18 +84,30 @@ class PackedElement(Element[T]):
         return calcsize("@"+cls.fmt())
 
     def get(self) -> T:
-        with memory(self.address) as mem:
-            item = unpack("@"+self.fmt(), mem.read(self.sizeof()))
+        return self._decode(get_backend().unpack("@"+self.fmt(), self.address))
+
+    @classmethod
+    def _decode(cls, item: Tuple[Any, ...]) -> T:
         return item[0] if len(item) == 1 else item
 
+    @classmethod
+    def typecode(cls) -> str:
+        # array.array / numpy type code with the same size and signedness as fmt().
+        fmt = cls.fmt()
+        if fmt in _ARRAY_TYPECODES:
+            return fmt
+        if fmt in "nN?cP":
+            signed = fmt == "n"
+            return (_SIGNED_TYPECODES if signed else _UNSIGNED_TYPECODES)[calcsize("@"+fmt)]
+        raise TypeError(f"{cls.__name__} has no array type code")
+
     def set(self, value: Union[Self, T]) -> T:
-        with memory(self.address) as mem:
-            if self.__class__ == value.__class__:
-                value = value()
-            if isinstance(value, tuple):
-                mem.write(pack("@"+self.fmt(), *value))
-            else:
-                mem.write(pack("@"+self.fmt(), value))
+        if self.__class__ == value.__class__:
+            value = value()
+        if isinstance(value, tuple):
+            get_backend().pack("@"+self.fmt(), self.address, *value)
+        else:
+            get_backend().pack("@"+self.fmt(), self.address, value)
         return value
 
     def repr_simple(self, visited: List[int]) -> str:
@@ -86,3 +115,9 @@ class PackedElement(Element[T]):
 
     def repr_rich(self, visited: List[int]) -> str:
         return f"{self.__class__.__name__}({self.get()})"
+
+
+def read_values(elements: Sequence[PackedElement]) -> List[Any]:
+    formats = [compiled_format("@"+element.fmt()) for element in elements]
+    buffers = get_backend().read_many([(element.address, fmt.size) for element, fmt in zip(elements, formats)])
+    return [element._decode(fmt.unpack(data)) for element, fmt, data in zip(elements, formats, buffers)]
@@ -0,0 +1,118 @@
+import os
+from bisect import bisect_right
+from time import monotonic
+from typing import NamedTuple, Optional, List, Iterator, Tuple
+
+__all__ = ("Region", "MemoryMap")
+
+# Smallest and largest addresses that can ever be mapped in user space on x86-64/aarch64.
+_MIN_ADDRESS = 0x1000
+_MAX_ADDRESS = 1 << 48
+# Minimum number of seconds between re-parses of the map for misses that the probe read cannot settle.
+_REFRESH_INTERVAL = 1.0
+
+
+class Region(NamedTuple):
+    start: int
+    end: int
+    perms: str
+    offset: int
+    path: str
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+    @property
+    def readable(self) -> bool:
+        return self.perms[0] == "r"
+
+    @property
+    def writable(self) -> bool:
+        return self.perms[1] == "w"
+
+    @property
+    def executable(self) -> bool:
+        return self.perms[2] == "x"
+
+    def __repr__(self):
+        return f"Region(0x{self.start:X}-0x{self.end:X} {self.perms} {self.path})"
+
+
+class MemoryMap:
+    def __init__(self, pid: Optional[int] = None):
+        self.path = "/proc/self/maps" if pid is None else f"/proc/{pid}/maps"
+        # Region list and their start addresses, swapped together so lookups never mix two parses.
+        self._index: Tuple[List[Region], List[int]] = ([], [])
+        self._refreshed = 0.0
+        try:
+            self._fd = os.open("/proc/self/mem" if pid is None else f"/proc/{pid}/mem", os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            self._fd = -1
+        self.refresh()
+
+    def refresh(self) -> None:
+        regions = []
+        with open(self.path) as fp:
+            for line in fp:
+                parts = line.split(maxsplit=5)
+                start, end = parts[0].split("-")
+                regions.append(Region(int(start, 16), int(end, 16), parts[1], int(parts[2], 16), parts[5].strip() if len(parts) > 5 else ""))
+        self._index = (regions, [region.start for region in regions])
+        self._refreshed = monotonic()
+
+    def _lookup(self, address: int) -> Optional[Region]:
+        regions, starts = self._index
+        index = bisect_right(starts, address) - 1
+        if index >= 0:
+            region = regions[index]
+            if address < region.end:
+                return region
+        return None
+
+    def _probe(self, address: int) -> bool:
+        # One-byte read of the target: far cheaper than parsing the map, and it fails for unmapped addresses.
+        if self._fd < 0:
+            return True
+        try:
+            return len(os.pread(self._fd, 1, address)) == 1
+        except OSError:
+            return False
+
+    def find(self, address: int, refresh: bool = True) -> Optional[Region]:
+        # Hits come from the parsed map. A miss may be a region mapped since the last parse, so the map is re-read
+        # when a probe read of the address succeeds. Unreadable addresses can still be new (PROT_NONE) mappings, but
+        # they only trigger a re-read once per _REFRESH_INTERVAL, which keeps dangling pointers cheap. Loops probing
+        # arbitrary words refresh once up front and pass refresh=False instead.
+        if not _MIN_ADDRESS <= address < _MAX_ADDRESS:
+            return None
+        region = self._lookup(address)
+        if region is None and refresh and (self._probe(address) or monotonic() - self._refreshed >= _REFRESH_INTERVAL):
+            self.refresh()
+            region = self._lookup(address)
+        return region
+
+    def readable(self, address: int, size: int = 1) -> bool:
+        end = address + max(size, 1)
+        while address < end:
+            region = self.find(address)
+            if region is None or not region.readable:
+                return False
+            address = region.end
+        return True
+
+    def regions(self, readable: bool = False) -> Iterator[Region]:
+        for region in self._index[0]:
+            if not readable or region.readable:
+                yield region
+
+    def __iter__(self) -> Iterator[Region]:
+        return self.regions()
+
+    def __len__(self) -> int:
+        return len(self._index[0])
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
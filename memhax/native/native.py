@@ -4,6 +4,8 @@ from memhax.element import PackedElement
 
 
 class LongLong(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "q"
@@ -14,6 +16,8 @@ class LongLong(PackedElement[int]):
 
 
 class UnsignedLongLong(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "Q"
@@ -24,6 +28,8 @@ class UnsignedLongLong(PackedElement[int]):
 
 
 class Long(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "l"
@@ -34,6 +40,8 @@ class Long(PackedElement[int]):
 
 
 class UnsignedLong(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "L"
@@ -44,6 +52,8 @@ class UnsignedLong(PackedElement[int]):
 
 
 class Integer(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "i"
@@ -54,6 +64,8 @@ class Integer(PackedElement[int]):
 
 
 class UnsignedInteger(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "I"
@@ -64,6 +76,8 @@ class UnsignedInteger(PackedElement[int]):
 
 
 class Short(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "h"
@@ -74,6 +88,8 @@ class Short(PackedElement[int]):
 
 
 class UnsignedShort(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "H"
@@ -84,6 +100,8 @@ class UnsignedShort(PackedElement[int]):
 
 
 class Byte(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "b"
@@ -94,6 +112,8 @@ class Byte(PackedElement[int]):
 
 
 class UnsignedByte(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "B"
@@ -104,6 +124,8 @@ class UnsignedByte(PackedElement[int]):
 
 
 class Float(PackedElement[float]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "f"
@@ -114,6 +136,8 @@ class Float(PackedElement[float]):
 
 
 class Double(PackedElement[float]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "d"
@@ -124,6 +148,8 @@ class Double(PackedElement[float]):
 
 
 class Char(PackedElement[bytes]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "c"
@@ -134,6 +160,8 @@ class Char(PackedElement[bytes]):
 
 
 class Boolean(PackedElement[bool]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "?"
@@ -144,6 +172,8 @@ class Boolean(PackedElement[bool]):
 
 
 class Py_ssize_t(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "n"
@@ -154,6 +184,8 @@ class Py_ssize_t(PackedElement[int]):
 
 
 class Py_size_t(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "N"
@@ -1,47 +1,103 @@
-from textwrap import indent
-from typing import TypeVar, get_args, Generic, List, Optional, Self, Type
+from array import array
+from mmap import PAGESIZE
+from typing import TypeVar, Generic, List, Optional, Self, Type, Any, Sequence, Iterator, Tuple, get_origin, Dict, ForwardRef
 
-from memhax.native.structs import _ForwardRoot
-from memhax.utils import memory, CONFIG
-from memhax.element import PackedElement, Element
-from memhax.utils import instance_type_args
+from memhax.native.structs import _ForwardRoot, Struct
+from memhax.utils import CONFIG, get_backend
+from memhax.element import PackedElement, Element, read_values
+from memhax.utils import readable
+from memhax.walker import join_repr
+
+_MAX_CHUNK = 16 * PAGESIZE
 
 E = TypeVar('E', bound=Element)
 T = TypeVar('T')
 S = TypeVar('S')
 
+_SPECIALIZATIONS: Dict[Tuple[type, Tuple[Any, ...]], type] = {}
+
+
+def _specialize(cls: type, params: Any) -> Optional[type]:
+    # Pointer[X] and the array generics become cached concrete subclasses with their type arguments stored in _args,
+    # so accessors never have to inspect __orig_class__ at runtime.
+    # Names of types not defined yet are kept as ForwardRefs and resolved when a struct field using them is first read.
+    if not isinstance(params, tuple):
+        params = (params,)
+    if any(isinstance(param, TypeVar) for param in params):
+        return None
+    params = tuple(ForwardRef(param) if isinstance(param, str) else param for param in params)
+    key = (cls, params)
+    special = _SPECIALIZATIONS.get(key)
+    if special is None:
+        name = f"{cls.__name__}[{', '.join(_param_name(param) for param in params)}]"
+        special = type(name, (cls,), {"__slots__": (), "__module__": cls.__module__, "__qualname__": name, "_args": params, "_origin": cls})
+        _SPECIALIZATIONS[key] = special
+    return special
+
+
+def _param_name(param: Any) -> str:
+    if isinstance(param, ForwardRef):
+        return param.__forward_arg__
+    return param.__name__ if hasattr(param, "__name__") else repr(param)
+
 
 class RawPointer(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return "P"
 
 
 class Pointer(PackedElement[E], _ForwardRoot):
+    __slots__ = ("raw", "root")
     raw: RawPointer
+    _args: Tuple[Any, ...] = ()
 
     def __init__(self, address: int):
         super().__init__(address)
         self.raw = RawPointer(self.address)
+        self.root = None
+
+    def __class_getitem__(cls, params):
+        return _specialize(cls, params) or super().__class_getitem__(params)
 
     @classmethod
     def fmt(cls) -> str:
         return "P"
 
+    @classmethod
+    def target(cls) -> Optional[Type[E]]:
+        return cls._args[0] if cls._args else None
+
+    @classmethod
+    def _target_size(cls) -> int:
+        size = cls.__dict__.get("_target_sizeof")
+        if size is None:
+            size = max(cls._args[0].sizeof(), 1) if cls._args else 1
+            cls._target_sizeof = size
+        return size
+
     @classmethod
     def typename(cls, complete_type: Optional[Type[Self]] = None) -> str:
-        if complete_type is None or isinstance(complete_type, type):
+        _type = cls.target()
+        if _type is None:
             return "void*"
-        _args = get_args(complete_type)
-        _type = _args[0]
         return f"{_type.typename(_type)}*"
 
+    def valid(self) -> bool:
+        address = self.raw()
+        if address == 0:
+            return False
+        return readable(address, self._target_size())
+
     def get(self) -> E:
-        _args = instance_type_args(self)
-        if _args is None:
+        if not self._args:
             raise TypeError("Cannot get value of a void pointer")
-        _type = _args[0]
-        item = _type(self.raw())
+        address = self.raw()
+        if not readable(address, self._target_size()):
+            raise ValueError(f"Pointer to unmapped memory: 0x{address:X}")
+        item = self._args[0](address)
         if isinstance(item, _ForwardRoot):
             item.set_root(self.root)
         return item
@@ -49,157 +105,377 @@ class Pointer(PackedElement[E], _ForwardRoot):
     def set(self, value: E) -> None:
         super().set(value.address)
 
-    def repr_handler(self, visited: List[int]):
-        _args = instance_type_args(self)
+    def children(self) -> Tuple[Tuple[Optional[str], Element, bool], ...]:
+        if self._args and self.valid():
+            return (None, self.get(), True),
+        return ()
 
-        if self.raw() == 0:
-            return "NULL"
-        if _args is None:
-            return f"Pointer(0x{self.raw():X})"
-        return super().repr_handler(visited)
+    def repr_children(self) -> Optional[Tuple[Tuple[Optional[str], Element, bool], ...]]:
+        if self.raw() == 0 or not self._args or not self.valid():
+            return None
+        return (None, self.get(), True),
 
-    def repr_simple(self, visited: List[int]) -> str:
-        child = self.get()
-        if child.address in visited:
-            child_repr = "..."
-        else:
-            child_repr = child.repr_handler(visited[:])
+    def repr_format(self, parts: List[Tuple[Optional[str], str]], rich: bool) -> str:
+        child_repr = parts[0][1]
+        if rich:
+            return f"Pointer({child_repr})"
         if CONFIG["hide_pointers_repr"]:
             return child_repr
-        else:
-            return f"*{child_repr}"
+        return f"*{child_repr}"
+
+    def repr_simple(self, visited: List[int]) -> str:
+        # Only reached for pointers that cannot be followed.
+        address = self.raw()
+        if address == 0:
+            return "NULL"
+        if not self._args:
+            return f"Pointer(0x{address:X})"
+        return f"INVALID(0x{address:X})"
 
     def repr_rich(self, visited: List[int]) -> str:
-        child = self.get()
-        if child.address in visited:
-            child_repr = "..."
-        else:
-            child_repr = child.repr_handler(visited[:])
-        return f"Pointer({child_repr})"
+        return self.repr_simple(visited)
 
 
 class _ArrayCommon(Element[List[E]], _ForwardRoot):
+    __slots__ = ("root",)
+    _args: Tuple[Any, ...] = ()
+
+    def __init__(self, address: int):
+        super().__init__(address)
+        self.root = None
+
+    def __class_getitem__(cls, params):
+        return _specialize(cls, params) or super().__class_getitem__(params)
+
+    def _item(self, _type: Type[E], address: int) -> E:
+        item = _type(address)
+        if isinstance(item, _ForwardRoot):
+            item.set_root(self.root)
+        return item
+
+    @classmethod
+    def _item_layout(cls) -> Tuple[Type[E], int, int]:
+        # Item type, alignment and distance between items, computed once per specialization.
+        _layout = cls.__dict__.get("_item_layout_cache")
+        if _layout is None:
+            _type = cls._args[0]
+            _align = _type.alignment()
+            stride = _type.sizeof()
+            rem = stride % _align
+            if rem != 0:
+                stride += _align - rem
+            _layout = (_type, _align, stride)
+            cls._item_layout_cache = _layout
+        return _layout
+
+    def _item_type(self) -> Type[E]:
+        return self._args[0]
+
+    def _geometry(self) -> Tuple[Type[E], int, int]:
+        # Address of the first item and distance between items, matching C array layout.
+        _type, _align, stride = self._item_layout()
+        start = self.address
+        rem = start % _align
+        if rem != 0:
+            start += _align - rem
+        return _type, start, stride
+
+    def _length(self) -> int:
+        raise NotImplementedError(self.__class__.__name__)
+
+    def _item_at(self, index: int) -> E:
+        _type, start, stride = self._geometry()
+        return self._item(_type, start + index * stride)
+
     @classmethod
     def alignment(cls) -> int:
-        return 1
+        return cls._item_layout()[1] if cls._args else 1
 
     @classmethod
     def sizeof(cls, instance: Optional[Self] = None) -> int:
-        return 0
+        if instance is None:
+            return 0
+        return len(instance) * cls._item_layout()[2]
 
     @classmethod
     def typename(cls, complete_type: Optional[Type[Self]] = None) -> str:
-        _args = get_args(complete_type)
-        _type = _args[0]
-        _size = _args[1] if len(_args) > 1 else ""
+        _type = cls._args[0]
+        _size = cls._args[1] if len(cls._args) > 1 else ""
         if callable(_size):
             _size = ""
 
         return f"{_type.typename(_type)}[{_size}]"
 
+    def get(self) -> List[E]:
+        return list(self)
+
     def set(self, value: T) -> None:
-        original = self.get()
-        if len(value) != len(original):
+        if len(value) != len(self):
             raise ValueError("Cannot set array of different size")
 
-        for old, new in zip(original, value):
+        for old, new in zip(self, value):
             old(new)
 
+    def values(self, deref: bool = False) -> List[Any]:
+        return _values(self.get(), deref)
+
+    def _packed_type(self) -> Type[PackedElement]:
+        _type = self._item_type()
+        if not issubclass(get_origin(_type) or _type, PackedElement):
+            raise TypeError(f"Array items of type {_type.typename(_type)} are not packed primitives")
+        return _type
+
+    def to_array(self) -> array:
+        return self[:].to_array()
+
+    def to_numpy(self):
+        return self[:].to_numpy()
+
+    def write_array(self, values: Any) -> None:
+        self[:].write_array(values)
+
+    def __len__(self) -> int:
+        return self._length()
+
+    def __iter__(self) -> Iterator[E]:
+        _type, start, stride = self._geometry()
+        for index in range(self._length()):
+            yield self._item(_type, start + index * stride)
+
     def __getitem__(self, item):
-        return self.get()[item]
+        if isinstance(item, slice):
+            return ArraySlice(self, range(len(self))[item])
+        length = len(self)
+        if item < 0:
+            item += length
+        if not 0 <= item < length:
+            raise IndexError("array index out of range")
+        return self._item_at(item)
 
     def __setitem__(self, key, value):
-        self.get()[key](value)
-
-    def repr_simple(self, visited: List[int]) -> str:
-        items = self.get()
-        if CONFIG["pretty_repr"]:
-            body = "\n" + ",\n".join(indent(item.repr_handler(visited[:]), "    ") for item in items) + "\n"
+        if isinstance(key, slice):
+            self[key].set(value)
         else:
-            body = ", ".join(item.repr_handler(visited[:]) for item in items)
-        return f"[{body}]"
+            self[key](value)
 
-    def repr_rich(self, visited: List[int]) -> str:
-        return f"{self.__class__.__name__}({self.repr_simple(visited)})"
+    def children(self) -> Iterator[Tuple[Optional[str], Element, bool]]:
+        for item in self:
+            yield None, item, False
 
-    def set_root(self, root: 'Struct'):
-        super().set_root(root)
-        for child in self.get():
-            if isinstance(child, _ForwardRoot):
-                child.set_root(root)
+    def repr_children(self) -> Optional[Iterator[Tuple[Optional[str], Element, bool]]]:
+        return self.children()
 
+    def repr_format(self, parts: List[Tuple[Optional[str], str]], rich: bool) -> str:
+        body = f"[{join_repr([text for _, text in parts])}]"
+        if rich:
+            # Specialized subclasses are named after their arguments; keep the generic name.
+            return f"{self.__class__.__name__.split('[')[0]}({body})"
+        return body
 
-class StaticSizeArray(_ArrayCommon[T], Generic[T, S]):
-    def get(self) -> T:
-        _type, _size = instance_type_args(self)
-        items = []
-        address = self.address
 
-        _align = _type.alignment()
-        _itemsize = _type.sizeof()
+class ArraySlice(Generic[E]):
+    # Lazy view over a range of array items; nothing is read until items are accessed.
+    __slots__ = ("array", "indices")
 
-        for _ in range(_size):
-            rem = (address % _align)
-            if rem != 0:
-                address += _align - rem
+    def __init__(self, array: _ArrayCommon[E], indices: range):
+        self.array = array
+        self.indices = indices
 
-            items.append(_type(address))
-            address += _itemsize
-        return items
+    def __len__(self) -> int:
+        return len(self.indices)
 
+    def __iter__(self) -> Iterator[E]:
+        for index in self.indices:
+            yield self.array._item_at(index)
 
-class PropertySizeArray(_ArrayCommon[T], Generic[T, S]):
-    def get(self) -> T:
-        _type, _size = instance_type_args(self)
-        items = []
-        address = self.address
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return ArraySlice(self.array, self.indices[item])
+        return self.array._item_at(self.indices[item])
 
-        _align = _type.alignment()
-        _itemsize = _type.sizeof()
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            self[key].set(value)
+        else:
+            self[key](value)
 
-        for _ in range(_size(self.root)):
-            rem = (address % _align)
-            if rem != 0:
-                address += _align - rem
+    def get(self) -> List[E]:
+        return list(self)
+
+    def set(self, value: Sequence[Any]) -> None:
+        if len(value) != len(self):
+            raise ValueError("Cannot set array of different size")
+
+        for old, new in zip(self, value):
+            old(new)
 
-            items.append(_type(address))
-            address += _itemsize
+    def values(self, deref: bool = False) -> List[Any]:
+        return _values(self.get(), deref)
+
+    def _span(self) -> Tuple[int, int, int]:
+        # Address of the lowest selected item, number of items covered by the selection and distance between items.
+        _, start, stride = self.array._geometry()
+        if not self.indices:
+            return start, 0, stride
+        low = min(self.indices[0], self.indices[-1])
+        high = max(self.indices[0], self.indices[-1])
+        return start + low * stride, high - low + 1, stride
+
+    def _read_span(self, itemsize: int) -> bytes:
+        # One contiguous read covering the selection.
+        address, count, stride = self._span()
+        if stride != itemsize:
+            _type = self.array._item_type()
+            raise TypeError(f"Array items of type {_type.typename(_type)} are {stride} bytes apart, not {itemsize}")
+        return get_backend().read(address, count * stride) if count else b""
+
+    def _select(self, items):
+        if self.indices.step != 1 and len(items):
+            items = items[self.indices[0] - min(self.indices[0], self.indices[-1])::self.indices.step]
         return items
 
+    def to_array(self) -> array:
+        items = array(self.array._packed_type().typecode())
+        items.frombytes(self._read_span(items.itemsize))
+        return self._select(items)
+
+    def to_numpy(self):
+        # Packed items become a plain ndarray, struct items a structured one built from Struct.numpy_dtype().
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("to_numpy() requires numpy to be installed") from None
+        _type = self.array._item_type()
+        if issubclass(get_origin(_type) or _type, Struct):
+            dtype = _type.numpy_dtype()
+        else:
+            dtype = numpy.dtype(self.array._packed_type().typecode())
+        return self._select(numpy.frombuffer(self._read_span(dtype.itemsize), dtype=dtype))
+
+    def write_array(self, values: Any) -> None:
+        if isinstance(values, (list, tuple)):
+            values = array(self.array._packed_type().typecode(), values)
+        view = memoryview(values)
+        address, _, stride = self._span()
+        if len(view) != len(self):
+            raise ValueError("Cannot set array of different size")
+        if view.itemsize != stride:
+            raise TypeError(f"Expected items of {stride} bytes, got {view.itemsize}")
+        data = view.cast("B")
+        if self.indices.step == 1:
+            get_backend().write(address, data)
+            return
+        _, start, _ = self.array._geometry()
+        for position, index in enumerate(self.indices):
+            get_backend().write(start + index * stride, data[position * stride:(position + 1) * stride])
 
-class NullTerminatedArray(_ArrayCommon[T], Generic[T]):
-    def get(self) -> T:
-        _type = instance_type_args(self)[0]
-        items = []
-        address = self.address
+    def __repr__(self):
+        return f"ArraySlice({self.indices.start}:{self.indices.stop}:{self.indices.step}, {self.get()!r})"
 
-        _align = _type.alignment()
-        _itemsize = _type.sizeof()
 
-        while True:
-            rem = (address % _align)
-            if rem != 0:
-                address += _align - rem
+def _read_all(elements: Sequence[Element]) -> List[Any]:
+    if not elements:
+        return []
+    if isinstance(elements[0], Struct):
+        return elements[0].values_many(elements)
+    if isinstance(elements[0], PackedElement):
+        return read_values(elements)
+    return [element.get() for element in elements]
 
-            with memory(address) as mem:
-                if all(b == 0 for b in mem.read(_itemsize)):
-                    return items
 
-            items.append(_type(address))
-            address += _itemsize
+def _values(items: List[Element], deref: bool) -> List[Any]:
+    if not deref or not items or not isinstance(items[0], Pointer):
+        return _read_all(items)
 
+    addresses = read_values(items)
+    _type = items[0].target()
+    targets = iter(_read_all([_type(address) for address in addresses if address != 0]))
+    return [None if address == 0 else next(targets) for address in addresses]
 
-class NullTerminatedString(Element):
-    def get(self) -> T:
-        chars = []
-        address = self.address
-        while True:
-            with memory(address) as mem:
-                if (byte := mem.read(1)) == b"\x00":
-                    return "".join(chars)
 
-            chars.append(byte.decode())
-            address += 1
+class StaticSizeArray(_ArrayCommon[T], Generic[T, S]):
+    __slots__ = ()
+
+    def _length(self) -> int:
+        return self._args[1]
+
+    @classmethod
+    def sizeof(cls, instance: Optional[Self] = None) -> int:
+        if not cls._args:
+            return 0
+        return cls._args[1] * cls._item_layout()[2]
+
+
+class PropertySizeArray(_ArrayCommon[T], Generic[T, S]):
+    __slots__ = ()
+
+    def _length(self) -> int:
+        return self._args[1](self.root)
+
+
+def _read_chunks(address: int, limit: int, granularity: int = 1) -> Iterator[Tuple[int, bytes]]:
+    # Page-aligned reads of growing size that stop at the end of each mapping, so a scan never reads past the
+    # region holding its terminator. Every chunk is a whole number of granularity-sized records.
+    memory_map = get_backend().memory_map
+    end = address + limit
+    size = PAGESIZE
+    while address < end:
+        region = memory_map.find(address)
+        if region is None or not region.readable:
+            raise ValueError(f"Read runs into unmapped memory at 0x{address:X}")
+        stop = min(end, region.end, address - address % PAGESIZE + size)
+        length = (stop - address) // granularity * granularity
+        if length == 0:
+            # A record straddles two adjacent mappings.
+            length = granularity
+            if not readable(address, length):
+                raise ValueError(f"Read runs into unmapped memory at 0x{address:X}")
+        yield address, get_backend().read(address, length)
+        address += length
+        size = min(size * 2, _MAX_CHUNK)
+
+
+class NullTerminatedArray(_ArrayCommon[T], Generic[T]):
+    __slots__ = ()
+
+    @classmethod
+    def sizeof(cls, instance: Optional[Self] = None) -> int:
+        if instance is None:
+            return 0
+        return (len(instance) + 1) * cls._item_layout()[2]
+
+    def _length(self) -> int:
+        _type, start, stride = self._geometry()
+        terminator = bytes(_type.sizeof())
+        limit = CONFIG["max_array_length"]
+        count = 0
+        for _, chunk in _read_chunks(start, limit * stride, stride):
+            position = 0
+            while (position := chunk.find(terminator, position)) >= 0:
+                if position % stride == 0:
+                    return count + position // stride
+                position = (position // stride + 1) * stride
+            count += len(chunk) // stride
+        raise ValueError(f"No terminator within {limit} items at 0x{start:X}")
+
+
+class NullTerminatedString(Element):
+    __slots__ = ()
+
+    def get(self, max_length: Optional[int] = None) -> str:
+        return self.read_bytes(max_length).decode(errors="backslashreplace")
+
+    def read_bytes(self, max_length: Optional[int] = None) -> bytes:
+        if max_length is None:
+            max_length = CONFIG["max_string_length"]
+        parts = []
+        for _, chunk in _read_chunks(self.address, max_length + 1):
+            end = chunk.find(b"\x00")
+            if end >= 0:
+                parts.append(chunk[:end])
+                return b"".join(parts)
+            parts.append(chunk)
+        raise ValueError(f"No terminator within {max_length} bytes at 0x{self.address:X}")
 
     @classmethod
     def typename(cls, complete_type: Optional[Type[Self]] = None) -> str:
@@ -213,10 +489,10 @@ class NullTerminatedString(Element):
     def sizeof(cls, instance: Optional[Self] = None) -> int:
         if instance is None:
             return 0
-        return len(instance.get()) + 1
+        return len(instance.read_bytes()) + 1
 
     def repr_simple(self, visited: List[int]) -> str:
-        if self.address < 1000:
+        if not readable(self.address):
             return "INVALID_STRING"
         return repr(self.get())
 
@@ -1,17 +1,20 @@
 import sys
-from typing import Optional, Type, Self, Union
+from typing import Optional, Type, Self, Union, Tuple
 
 from memhax.element import PackedElement
 
 
 class uintX_t(PackedElement[int]):
+    __slots__ = ()
+
     @classmethod
     def fmt(cls) -> str:
         return f"{cls.num_bytes()}B"
 
-    def get(self) -> int:
-        _bytes = super().get()
-        _size = self.num_bytes()
+    @classmethod
+    def _decode(cls, item: Tuple[int, ...]) -> int:
+        _bytes = item
+        _size = cls.num_bytes()
         if sys.byteorder == "big":
             _bytes = _bytes[::-1]
         return sum(_bytes[i] << (8 * i) for i in range(_size))
@@ -28,6 +31,10 @@ class uintX_t(PackedElement[int]):
         super().set(tuple(_bytes))
         return value
 
+    @classmethod
+    def typecode(cls) -> str:
+        return {1: "B", 2: "H", 4: "I", 8: "Q"}[cls.num_bytes()]
+
     @classmethod
     def typename(cls, complete_type: Optional[Type[Self]] = None) -> str:
         return f"uint{cls.num_bytes() * 8}_t"
@@ -38,24 +45,32 @@ class uintX_t(PackedElement[int]):
 
 
 class uint8_t(uintX_t):
+    __slots__ = ()
+
     @classmethod
     def num_bytes(cls) -> int:
         return 1
 
 
 class uint16_t(uintX_t):
+    __slots__ = ()
+
     @classmethod
     def num_bytes(cls) -> int:
         return 2
 
 
 class uint32_t(uintX_t):
+    __slots__ = ()
+
     @classmethod
     def num_bytes(cls) -> int:
         return 4
 
 
 class uint64_t(uintX_t):
+    __slots__ = ()
+
     @classmethod
     def num_bytes(cls) -> int:
         return 8
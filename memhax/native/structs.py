@@ -1,30 +1,50 @@
-from textwrap import indent
-from typing import get_type_hints, Optional, Self, Type, TypeVar, List
+import sys
+from functools import lru_cache
+from struct import Struct as _CompiledFormat, calcsize
+from types import MappingProxyType
+from typing import get_type_hints, Optional, Self, Type, TypeVar, List, Dict, Any, Sequence, get_origin, Tuple, NamedTuple, Iterator, ForwardRef
 
-from memhax.element import Element
-from memhax.utils import CONFIG
+from memhax.backends import compiled_format
+from memhax.element import Element, PackedElement
+from memhax.utils import get_backend
+from memhax.walker import join_repr
 
 T = TypeVar('T')
 
+_type_hints = lru_cache(maxsize=None)(get_type_hints)
+
+
+def _resolve_forward_refs(cls: Any, globalns: dict, localns: dict) -> Any:
+    # Pointer['Node'] keeps the name as a ForwardRef in _args; like get_type_hints, it is evaluated in the module
+    # of the struct using it and the generic is specialized again with the real type.
+    args = getattr(cls, "_args", None)
+    if not args:
+        return cls
+    resolved = tuple(
+        _resolve_forward_refs(eval(arg.__forward_code__, globalns, localns) if isinstance(arg, ForwardRef) else arg, globalns, localns)
+        for arg in args
+    )
+    return cls if resolved == args else cls._origin[resolved]
+
 
 class StructMember:
     def __init__(self, name: str, parent: type):
         self.name = name
         self.parent = parent
-        self._hints = None
+        self._type = None
 
     @property
     def hints(self) -> dict:
-        if self._hints is None:
-            self._hints = get_type_hints(self.parent)
-        return self._hints
+        return _type_hints(self.parent)
 
     @property
     def type(self) -> Type[Element]:
-        cls = self.hints[self.name]
-        if hasattr(cls, "__orig_class__"):
-            cls = cls.__orig_class__
-        return cls
+        if self._type is None:
+            cls = self.hints[self.name]
+            if not isinstance(cls, type) and hasattr(cls, "__orig_class__"):
+                cls = cls.__orig_class__
+            self._type = _resolve_forward_refs(cls, vars(sys.modules[self.parent.__module__]), dict(vars(self.parent)))
+        return self._type
 
     @property
     def size(self) -> int:
@@ -34,11 +54,110 @@ class StructMember:
     def alignment(self) -> int:
         return self.type.alignment()
 
+    @property
+    def packed(self) -> bool:
+        return issubclass(get_origin(self.type) or self.type, PackedElement)
+
+    def __get__(self, instance: Optional['Struct'], owner: Optional[type] = None):
+        if instance is None:
+            return self
+        # Field elements are only built when first accessed, then kept on the instance.
+        children = instance._children
+        item = children.get(self.name)
+        if item is None:
+            item = self.type(instance.address + instance.__class__.layout[self.name].offset)
+            if isinstance(item, _ForwardRoot):
+                item.set_root(instance)
+            children[self.name] = item
+        return item
+
+
+class FieldLayout(NamedTuple):
+    name: str
+    type: Type[Element]
+    offset: int
+    size: int
+    alignment: int
+    packed: bool
+
+
+class StructLayout:
+    __slots__ = ("name", "fields", "size", "alignment", "stride", "format", "_by_name", "_decoders")
+
+    def __init__(self, cls: 'StructMeta'):
+        self.name = cls.__name__
+        fields = []
+        offset = 0
+        for member in cls._struct_fields:
+            _type = member.type
+            align = _type.alignment()
+            rem = offset % align
+            if rem != 0:
+                offset += align - rem
+            size = _type.sizeof()
+            fields.append(FieldLayout(member.name, _type, offset, size, align, member.packed))
+            offset += size
+
+        self.fields: Tuple[FieldLayout, ...] = tuple(fields)
+        self.size = offset
+        self.alignment = max((field.alignment for field in fields), default=1)
+        # Size including tail padding, i.e. the distance between consecutive structs in an array.
+        self.stride = -(-offset // self.alignment) * self.alignment
+        self._by_name = MappingProxyType({field.name: field for field in fields})
+        self._compile()
+
+    def _compile(self) -> None:
+        # One struct format covering every packed field, with explicit padding in between.
+        fmt = "@"
+        decoders = []
+        for field in self.fields:
+            if not field.packed:
+                continue
+            padding = field.offset - calcsize(fmt)
+            if padding < 0:
+                raise TypeError(f"Field {field.name} of {self.name} overlaps the previous field")
+            field_fmt = field.type.fmt()
+            fmt += f"{padding}x{field_fmt}" if padding else field_fmt
+            if calcsize(fmt) != field.offset + field.size:
+                raise TypeError(f"Field {field.name} of {self.name} cannot be expressed as a struct format")
+            decoders.append((field.name, field.type._decode, len(compiled_format("@" + field_fmt).unpack(bytes(field.size)))))
+        self.format: _CompiledFormat = compiled_format(fmt)
+        self._decoders = tuple(decoders)
+
+    def __getitem__(self, name: str) -> FieldLayout:
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise ValueError(f'Field {name} not found in {self.name}') from None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def offset_after(self, name: str) -> int:
+        field = self[name]
+        return field.offset + field.size
+
+    def decode(self, items: Tuple[Any, ...]) -> Dict[str, Any]:
+        values = {}
+        position = 0
+        for name, decode, count in self._decoders:
+            values[name] = decode(items[position:position + count])
+            position += count
+        return values
+
 
 class StructMeta(type):
     def __new__(mcs, name, bases, namespace, **kwargs):
+        namespace.setdefault("__slots__", ())
         cls = super().__new__(mcs, name, bases, namespace, **kwargs)
         cls._struct_fields = []
+        cls._layout = None
 
         for parent_class in bases:
             if hasattr(parent_class, '_struct_fields'):
@@ -50,6 +169,13 @@ class StructMeta(type):
             cls._struct_fields.append(member)
         return cls
 
+    @property
+    def layout(cls) -> StructLayout:
+        # Field types may be forward references, so the layout is built on first use rather than in __new__.
+        if cls._layout is None:
+            cls._layout = StructLayout(cls)
+        return cls._layout
+
     def __repr__(self):
         entries = [
             (member.type.typename(member.type), member.name)
@@ -64,71 +190,102 @@ class StructMeta(type):
 
 
 class Struct(Element[T], metaclass=StructMeta):
+    __slots__ = ("_children",)
+
     def __init__(self, address: int):
         super().__init__(address)
-        self._offset = 0
-
-        # noinspection PyProtectedMember
-        for member in self.__class__._struct_fields:
-            self._align(member.alignment)
-            item = member.type(address + self._offset)
-            if isinstance(item, _ForwardRoot):
-                item.set_root(self)
-            self._offset += member.size
-
-            setattr(self, member.name, item)
-
-    def _align(self, to: int) -> None:
-        rem = (self.address + self._offset) % to
-        if rem != 0:
-            self._offset += to - rem
+        self._children = {}
 
     @classmethod
     def alignment(cls) -> int:
-        return max(item.alignment() for item in get_type_hints(cls).values())
+        return cls.layout.alignment
 
     @classmethod
     def sizeof(cls, instance: Optional[Self] = None) -> int:
+        if instance is None:
+            return cls.layout.size
         offset = 0
-        for member in cls._struct_fields:
-            _type = member.type
-            align = _type.alignment()
-            rem = offset % align
+        for field in cls.layout.fields:
+            rem = offset % field.alignment
             if rem != 0:
-                offset += align - rem
-            offset += _type.sizeof(getattr(instance, member.name, instance))
+                offset += field.alignment - rem
+            offset += field.type.sizeof(getattr(instance, field.name))
         return offset
 
     @classmethod
     def offsetof(cls, field) -> int:
-        offset = 0
-        for member in cls._struct_fields:
-            if member.name == field.name:
-                return offset
-            rem = offset % member.alignment
-            if rem != 0:
-                offset += member.alignment - rem
-            offset += member.size
-        raise ValueError(f'Field {field.name} not found in {cls.__name__}')
+        return cls.layout[field.name].offset
 
     @classmethod
     def offset_after(cls, field) -> int:
-        return cls.offsetof(field) + field.size
+        return cls.layout.offset_after(field.name)
 
     @classmethod
     def typename(cls, complete_type: Optional[Type[Self]] = None) -> str:
         return cls.__name__
 
-    def repr_rich(self, visited: List[int]) -> str:
-        attrs = [(item.name, getattr(self, item.name)) for item in self.__class__._struct_fields]
-        if CONFIG["pretty_repr"]:
-            body = "\n" + ",\n".join(indent(f"{attr}={field.repr_handler(visited[:])}", "    ") for attr, field in attrs) + "\n"
-        else:
-            body = ", ".join(f"{attr}={field.repr_handler(visited[:])}" for attr, field in attrs)
-        return f"{self.__class__.__name__}({body})"
+    @classmethod
+    def numpy_dtype(cls):
+        # Structured dtype for the packed and nested struct fields; variable-size fields are left out.
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("numpy_dtype() requires numpy to be installed") from None
+        layout = cls.layout
+        names, formats, offsets = [], [], []
+        for field in layout.fields:
+            origin = get_origin(field.type) or field.type
+            if field.packed:
+                fmt = field.type.typecode()
+            elif issubclass(origin, Struct):
+                fmt = origin.numpy_dtype()
+            else:
+                continue
+            names.append(field.name)
+            formats.append(fmt)
+            offsets.append(field.offset)
+        return numpy.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": layout.stride})
+
+    @classmethod
+    def compiled_format(cls) -> Tuple[_CompiledFormat, List[Tuple[str, Type[PackedElement], int]]]:
+        # The layout's struct format for every packed field, with (name, type, number of unpacked values) per field.
+        layout = cls.layout
+        packed = [field for field in layout.fields if field.packed]
+        return layout.format, [(field.name, field.type, count) for field, (_, _, count) in zip(packed, layout._decoders)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        # Every packed field from one read and one unpack; pointers are returned as raw addresses.
+        layout = self.__class__.layout
+        if not layout.format.size:
+            return {}
+        return layout.decode(get_backend().unpack(layout.format.format, self.address))
+
+    def values(self) -> Dict[str, Any]:
+        return self.snapshot()
+
+    @classmethod
+    def values_many(cls, instances: Sequence[Self]) -> List[Dict[str, Any]]:
+        layout = cls.layout
+        # Structs without packed fields have nothing to read; avoid issuing zero-size reads.
+        if not layout.format.size:
+            return [{} for _ in instances]
+        buffers = get_backend().read_many([(instance.address, layout.format.size) for instance in instances])
+        return [layout.decode(layout.format.unpack(data)) for data in buffers]
+
+    def children(self) -> Iterator[Tuple[str, Element, bool]]:
+        for item in self.__class__._struct_fields:
+            yield item.name, getattr(self, item.name), False
+
+    def repr_children(self) -> Optional[Iterator[Tuple[str, Element, bool]]]:
+        return self.children()
+
+    def repr_format(self, parts: List[Tuple[Optional[str], str]], rich: bool) -> str:
+        return f"{self.__class__.__name__}({join_repr([f'{attr}={text}' for attr, text in parts])})"
 
 
 class _ForwardRoot:
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         self.root = None
 
@@ -0,0 +1,426 @@
+import re
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from ctypes import memset, addressof, c_char
+from mmap import PAGESIZE
+from threading import local, Lock
+from typing import Type, List, Tuple, Callable, Iterator, Any, Optional, Union
+
+from memhax.backends import MemoryBackend, DirectMemoryBackend, FileMemoryBackend, CachedMemoryBackend, compiled_format
+from memhax.element import PackedElement
+from memhax.maps import Region
+from memhax.utils import get_backend, numpy_or_none
+
+__all__ = ("ValueScanner", "Signature", "find_signature")
+
+_CHUNK = 16 << 20
+# Mapped but not safe (or not useful) to read through every backend.
+_SKIPPED_PATHS = ("[vvar]", "[vvar_vclock]", "[vsyscall]")
+
+
+@contextmanager
+def _scan_backend():
+    # Regions can be unmapped while a scan runs (freed arenas, other threads); pread reports EIO there
+    # where a direct read would crash the process, and it releases the GIL.
+    # A scan reads everything once, so it bypasses a page cache rather than filling it with copies of the process.
+    backend = get_backend()
+    while isinstance(backend, CachedMemoryBackend):
+        backend = backend.backend
+    if isinstance(backend, DirectMemoryBackend):
+        backend = FileMemoryBackend()
+        try:
+            yield backend
+        finally:
+            backend.close()
+    else:
+        yield backend
+
+
+def _regions(backend: MemoryBackend, writable: bool) -> Iterator[Region]:
+    # The map is cached per backend; a scan has to see regions mapped since the last one.
+    memory_map = backend.memory_map
+    memory_map.refresh()
+    for region in memory_map.regions(readable=True):
+        if writable and not region.writable:
+            continue
+        if region.path in _SKIPPED_PATHS or region.path.startswith("/dev/"):
+            continue
+        yield region
+
+
+class _ScanBuffer:
+    # Memory the scanner reads into or keeps values in. When scanning our own process it holds copies of what was
+    # scanned, so matches inside it are dropped, and its owner zeroes it once done so no copies outlive the scan.
+    def __init__(self, size: int):
+        self.data = bytearray(size)
+        self.address = addressof((c_char * size).from_buffer(self.data)) if size else 0
+
+    def read(self, backend: MemoryBackend, address: int, size: int, offset: int = 0) -> int:
+        try:
+            return backend.readinto(address, memoryview(self.data)[offset:offset + size])
+        except OSError:
+            return 0
+
+    def overlaps(self, address: int, size: int) -> bool:
+        return address < self.address + len(self.data) and self.address < address + size
+
+    def clear(self) -> None:
+        if self.data:
+            memset(self.address, 0, len(self.data))
+
+
+def _array_overlaps(item: array, address: int, size: int) -> bool:
+    start, length = item.buffer_info()
+    return address < start + length * item.itemsize and start < address + size
+
+
+def _chunks(backend: MemoryBackend, region: Region, overlap: int, buffer: _ScanBuffer) -> Iterator[Tuple[int, memoryview]]:
+    # Each chunk carries `overlap` extra bytes so values straddling a chunk boundary are still seen once.
+    for address in range(region.start, region.end, _CHUNK):
+        length = buffer.read(backend, address, min(_CHUNK + overlap, region.end - address))
+        if length:
+            yield address, memoryview(buffer.data)[:length]
+
+
+class ValueScanner:
+    def __init__(self, element_type: Type[PackedElement], aligned: bool = True, writable: bool = False):
+        self.element_type = element_type
+        # One value per item: fmt() of the fixed-width types is a byte sequence such as "4B".
+        self.typecode = element_type.typecode()
+        self.format = compiled_format("@" + self.typecode)
+        self.size = self.format.size
+        self.step = element_type.alignment() if aligned else 1
+        self.writable = writable
+        # Sorted candidate addresses and the value each one had at the last scan.
+        self.candidates = array("Q")
+        self._values = _ScanBuffer(0)
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    @property
+    def values(self) -> memoryview:
+        # A read-only view of the scanner's own copy of the values, zeroed by the next scan.
+        return memoryview(self._values.data).cast(self.typecode).toreadonly()
+
+    def addresses(self) -> array:
+        return self.candidates
+
+    def elements(self) -> List[PackedElement]:
+        return [self.element_type(address) for address in self.candidates]
+
+    # First scan over every readable region
+
+    def scan_equal(self, value) -> int:
+        operands = self._operands(value)
+        return self._scan(lambda view, bounds: view == bounds[0], lambda data: self._find(data, operands.data), operands)
+
+    def scan_range(self, low, high) -> int:
+        return self._scan(
+            lambda view, bounds: (view >= bounds[0]) & (view <= bounds[1]),
+            lambda data: self._filter(data, lambda item: low <= item <= high),
+            self._operands(low, high),
+        )
+
+    def _operands(self, *values) -> _ScanBuffer:
+        # The values compared against live in a scan buffer, so they are neither matched nor left behind.
+        operands = _ScanBuffer(len(values) * self.size)
+        for index, value in enumerate(values):
+            self.format.pack_into(operands.data, index * self.size, value)
+        return operands
+
+    def _bounds(self, np, operands: Optional[_ScanBuffer]) -> List[Any]:
+        # numpy compares against one-item views of the operand buffer; converting a Python value would leave a copy
+        # of it in numpy's buffer cache. Without numpy the operands are plain ints.
+        if operands is None:
+            return []
+        if np is None:
+            return list(memoryview(operands.data).cast(self.typecode))
+        items = np.frombuffer(operands.data, np.dtype(self.typecode))
+        return [items[index:index + 1] for index in range(len(items))]
+
+    def _scan(self, vector_test: Callable, fallback: Callable[[memoryview], List[int]], operands: _ScanBuffer) -> int:
+        # Only addresses are collected while scanning, so no copies of the matched values exist for the scan to find;
+        # the values are read afterwards.
+        np = numpy_or_none()
+        candidates = array("Q")
+        buffer = _ScanBuffer(_CHUNK + self.size - 1)
+        buffers = (operands, buffer, self._values)
+        try:
+            with _scan_backend() as backend:
+                bounds = self._bounds(np, operands)
+                self._scan_regions(backend, np, lambda view: vector_test(view, bounds), fallback, candidates, buffer)
+                local_scan = backend.local
+        finally:
+            for item in (operands, buffer):
+                item.clear()
+        if local_scan:
+            candidates = array("Q", [
+                address for address in candidates
+                if not any(item.overlaps(address, self.size) for item in buffers)
+                and not _array_overlaps(self.candidates, address, self.size)
+            ])
+        values = self._values
+        self.candidates, self._values = candidates, _ScanBuffer(len(candidates) * self.size)
+        values.clear()
+        return self._narrow(None)
+
+    def _scan_regions(self, backend: MemoryBackend, np, vector_test: Callable, fallback: Callable[[memoryview], List[int]], candidates: array, buffer: _ScanBuffer) -> None:
+        for region in _regions(backend, self.writable):
+            for address, data in _chunks(backend, region, self.size - 1, buffer):
+                if np is not None:
+                    offsets = self._match_numpy(np, data, vector_test)
+                    candidates.frombytes((offsets + address).astype("u8").tobytes())
+                else:
+                    candidates.extend(address + offset for offset in fallback(data))
+
+    def _match_numpy(self, np, data: memoryview, vector_test: Callable) -> Any:
+        dtype = np.dtype(self.typecode)
+        hits = []
+        for phase in range(0, self.size, self.step):
+            count = (len(data) - phase) // self.size
+            if count <= 0:
+                break
+            view = np.frombuffer(data, dtype, count, phase)
+            hits.append(np.flatnonzero(vector_test(view)) * self.size + phase)
+        offsets = np.sort(np.concatenate(hits)) if hits else np.zeros(0, "u8")
+        return offsets[offsets < _CHUNK]
+
+    def _gather(self, np, data: Union[bytes, memoryview], offsets) -> Any:
+        raw = np.frombuffer(data, np.uint8)
+        return raw[offsets[:, None] + np.arange(self.size)].view(np.dtype(self.typecode)).ravel()
+
+    def _find(self, data: memoryview, needle: bytearray) -> List[int]:
+        # bytes.find skips on the needle's last byte, which crawls through zeroed memory when that byte is 0
+        # (small integers); search for the part up to the last non-zero byte and verify the rest.
+        # Slices are memoryviews so no copies of the needle are made.
+        length = len(needle)
+        while length > 1 and not needle[length - 1]:
+            length -= 1
+        prefix = memoryview(needle)[:length]
+        buffer = data.obj
+        size = len(data)
+        offsets = []
+        end = min(size, _CHUNK)
+        limit = min(size, end + length - 1)
+        position = buffer.find(prefix, 0, limit)
+        while position != -1 and position < end:
+            if position % self.step == 0 and position + self.size <= size and data[position:position + self.size] == needle:
+                offsets.append(position)
+            position = buffer.find(prefix, position + 1, limit)
+        return offsets
+
+    def _filter(self, data: memoryview, test: Callable[[Any], bool]) -> List[int]:
+        offsets = []
+        view = data
+        for phase in range(0, self.size, self.step):
+            count = (len(data) - phase) // self.size
+            if count <= 0:
+                break
+            items = view[phase:phase + count * self.size].cast(self.typecode)
+            offsets.extend(phase + index * self.size for index, item in enumerate(items) if test(item))
+        offsets.sort()
+        return [offset for offset in offsets if offset < _CHUNK]
+
+    # Next scans only re-read the pages that still hold candidates
+
+    def next_equal(self, value) -> int:
+        return self._narrow(lambda new, old, bounds: new == bounds[0], self._operands(value))
+
+    def next_range(self, low, high) -> int:
+        return self._narrow(lambda new, old, bounds: (new >= bounds[0]) & (new <= bounds[1]), self._operands(low, high))
+
+    def next_changed(self) -> int:
+        return self._narrow(lambda new, old, bounds: new != old)
+
+    def next_unchanged(self) -> int:
+        return self._narrow(lambda new, old, bounds: new == old)
+
+    def next_increased(self) -> int:
+        return self._narrow(lambda new, old, bounds: new > old)
+
+    def next_decreased(self) -> int:
+        return self._narrow(lambda new, old, bounds: new < old)
+
+    def _spans(self) -> List[Tuple[int, int]]:
+        # Merge the pages touched by candidates into (address, size) runs.
+        spans: List[List[int]] = []
+        page_mask = PAGESIZE - 1
+        for address in self.candidates:
+            start = address & ~page_mask
+            end = ((address + self.size - 1) | page_mask) + 1
+            if spans and start <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], end)
+            else:
+                spans.append([start, end])
+        return [(start, end - start) for start, end in spans]
+
+    def _reread(self) -> Tuple[_ScanBuffer, List[int], List[Tuple[int, int]]]:
+        # Candidate pages are read into one scan buffer, which the caller clears once the values are taken out.
+        with _scan_backend() as backend:
+            memory_map = backend.memory_map
+            spans = [span for span in self._spans() if memory_map.readable(*span)]
+            # Offset of each span inside the buffer
+            positions = []
+            position = 0
+            for _, size in spans:
+                positions.append(position)
+                position += size
+            blob = _ScanBuffer(position)
+            for (address, size), position in zip(spans, positions):
+                blob.read(backend, address, size, position)
+        return blob, positions, spans
+
+    def _narrow(self, test: Optional[Callable[[Any, Any, List[Any]], Any]], operands: Optional[_ScanBuffer] = None) -> int:
+        # A test of None keeps every readable candidate and only refreshes its value.
+        candidates, values = self.candidates, self._values
+        blob, positions, spans = self._reread()
+        np = numpy_or_none() if len(candidates) else None
+        try:
+            bounds = self._bounds(np, operands)
+            kept = self._narrow_numpy(blob.data, positions, spans, test, bounds) if np is not None \
+                else self._narrow_python(blob.data, positions, spans, test, bounds)
+        finally:
+            blob.clear()
+            if operands is not None:
+                operands.clear()
+        self.candidates, self._values = kept
+        values.clear()
+        return len(self.candidates)
+
+    def _narrow_numpy(self, blob: bytearray, positions: List[int], spans: List[Tuple[int, int]], test: Optional[Callable[[Any, Any, List[Any]], Any]], bounds: List[Any]) -> Tuple[array, _ScanBuffer]:
+        np = numpy_or_none()
+        starts = np.array([start for start, _ in spans], np.uint64)
+        addresses = np.frombuffer(self.candidates, np.uint64)
+        span_index = np.searchsorted(starts, addresses, "right").astype(np.int64) - 1
+        ends = np.array([start + size for start, size in spans] or [0], np.uint64)
+        live = (span_index >= 0) & (addresses + self.size <= ends[np.maximum(span_index, 0)])
+        addresses, old, span_index = addresses[live], np.frombuffer(self._values.data, np.dtype(self.typecode))[live], span_index[live]
+        offsets = addresses - starts[span_index] + np.array(positions, np.uint64)[span_index]
+        new = self._gather(np, blob, offsets.astype(np.int64))
+        keep = slice(None) if test is None else test(new, old, bounds)
+        candidates = array("Q")
+        candidates.frombytes(memoryview(addresses[keep]).cast("B"))
+        kept = new[keep]
+        values = _ScanBuffer(len(kept) * self.size)
+        np.frombuffer(values.data, np.dtype(self.typecode))[:] = kept
+        # Copies of scanned values are zeroed before numpy frees them.
+        for item in (old, new, kept):
+            item.fill(0)
+        return candidates, values
+
+    def _narrow_python(self, blob: bytearray, positions: List[int], spans: List[Tuple[int, int]], test: Optional[Callable[[Any, Any, List[Any]], Any]], bounds: List[Any]) -> Tuple[array, _ScanBuffer]:
+        starts = [start for start, _ in spans]
+        kept_candidates = []
+        kept_values = []
+        for address, old in zip(self.candidates, self.values):
+            index = bisect_right(starts, address) - 1
+            if index < 0 or address + self.size > starts[index] + spans[index][1]:
+                continue
+            new = self.format.unpack_from(blob, address - starts[index] + positions[index])[0]
+            if test is None or test(new, old, bounds):
+                kept_candidates.append(address)
+                kept_values.append(new)
+        # Packed straight into a buffer of the final size, so no partly grown copies of the values are left behind.
+        values = _ScanBuffer(len(kept_values) * self.size)
+        for index, value in enumerate(kept_values):
+            self.format.pack_into(values.data, index * self.size, value)
+        return array("Q", kept_candidates), values
+
+
+class Signature:
+    # A byte pattern such as "48 8B ?? ?? 05"; "??" (or "?") matches any byte.
+    def __init__(self, pattern: str):
+        tokens = pattern.split()
+        self.data = bytes(0 if token.strip("?") == "" else int(token, 16) for token in tokens)
+        self.mask = bytes(0 if token.strip("?") == "" else 1 for token in tokens)
+        self._compile()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, mask: Optional[Union[bytes, str]] = None) -> 'Signature':
+        # mask uses "x" for bytes that must match and "?" for wildcards, one character per byte.
+        self = cls.__new__(cls)
+        self.data = bytes(data)
+        self.mask = bytes(1 for _ in data) if mask is None else bytes(0 if char in "?" else 1 for char in (mask.decode() if isinstance(mask, bytes) else mask))
+        if len(self.mask) != len(self.data):
+            raise ValueError("Signature mask must have one character per byte")
+        self._compile()
+        return self
+
+    def _compile(self) -> None:
+        self.size = len(self.data)
+        runs = []
+        start = None
+        for index, fixed in enumerate(self.mask + b"\0"):
+            if fixed and start is None:
+                start = index
+            elif not fixed and start is not None:
+                runs.append((start, self.data[start:index]))
+                start = None
+        if not runs:
+            raise ValueError("Signature needs at least one non-wildcard byte")
+        # bytes.find locates the anchor; trailing zero bytes make it crawl through zeroed memory, so they are verified instead.
+        self.anchor_offset, anchor = max(runs, key=lambda run: (len(run[1].rstrip(b"\0")), len(run[1])))
+        self.anchor = anchor.rstrip(b"\0") or anchor
+        self.pattern = re.compile(b"".join(re.escape(bytes((byte,))) if fixed else b"." for byte, fixed in zip(self.data, self.mask)), re.DOTALL)
+
+    def search(self, data: Union[bytes, bytearray], end: int, alignment: int = 1, length: Optional[int] = None) -> List[int]:
+        # Offsets of matches starting before `end`, looking at the first `length` bytes of data.
+        if length is None:
+            length = len(data)
+        offsets = []
+        position = data.find(self.anchor, self.anchor_offset, length)
+        while position != -1:
+            start = position - self.anchor_offset
+            if start >= end:
+                break
+            if start % alignment == 0 and self.pattern.match(data, start, length):
+                offsets.append(start)
+            position = data.find(self.anchor, position + 1, length)
+        return offsets
+
+    def __repr__(self):
+        return f"Signature({' '.join(f'{byte:02X}' if fixed else '??' for byte, fixed in zip(self.data, self.mask))})"
+
+
+def find_signature(signature: Union[Signature, str], alignment: int = 1, writable: bool = False, threads: Optional[int] = None) -> List[int]:
+    # Every matching address, in ascending order. Chunks are read and searched on a thread pool;
+    # reads through FileMemoryBackend release the GIL, so they overlap with searching other chunks.
+    if isinstance(signature, str):
+        signature = Signature(signature)
+    with _scan_backend() as backend:
+        return _find_signature(backend, signature, alignment, writable, threads)
+
+
+def _find_signature(backend: MemoryBackend, signature: Signature, alignment: int, writable: bool, threads: Optional[int]) -> List[int]:
+    tasks = [
+        (address, min(_CHUNK + signature.size - 1, region.end - address))
+        for region in _regions(backend, writable)
+        for address in range(region.start, region.end, _CHUNK)
+    ]
+    # One read buffer per worker thread.
+    workers = local()
+    buffers: List[_ScanBuffer] = []
+    lock = Lock()
+
+    def scan(task: Tuple[int, int]) -> List[int]:
+        address, size = task
+        buffer = getattr(workers, "buffer", None)
+        if buffer is None:
+            buffer = workers.buffer = _ScanBuffer(_CHUNK + signature.size - 1)
+            with lock:
+                buffers.append(buffer)
+        length = buffer.read(backend, address, size)
+        return [address + offset for offset in signature.search(buffer.data, _CHUNK, alignment, length)]
+
+    try:
+        with ThreadPoolExecutor(threads) as pool:
+            found = [address for matches in pool.map(scan, tasks) for address in matches]
+    finally:
+        for buffer in buffers:
+            buffer.clear()
+    if not backend.local:
+        return found
+    return [address for address in found if not any(buffer.overlaps(address, signature.size) for buffer in buffers)]
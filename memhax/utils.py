@@ -2,14 +2,20 @@ import atexit
 from contextlib import contextmanager
 from typing import get_args, Any, Optional, Tuple
 
+from memhax.backends import MemoryBackend, FileMemoryBackend
 
-_MEMORY = open("/proc/self/mem", "r+b")
+# /proc/self/mem turns bad addresses into OSError; DirectMemoryBackend is faster but opt-in, since it crashes on them.
+_BACKEND: MemoryBackend = FileMemoryBackend()
 CONFIG = {
     "simplified_repr": True,
     "pretty_repr": True,
     "hide_pointers_repr": True,
+    "max_string_length": 1 << 20,
+    "max_array_length": 1 << 20,
+    "repr_max_depth": None,
+    "repr_max_nodes": None,
 }
-__all__ = ("CONFIG", "memory", "instance_type_args")
+__all__ = ("CONFIG", "memory", "instance_type_args", "get_backend", "set_backend", "use_backend", "attach", "readable", "numpy_or_none")
 
 
 def instance_type_args(instance: Any) -> Optional[Tuple[Any, ...]]:
@@ -19,15 +25,76 @@ def instance_type_args(instance: Any) -> Optional[Tuple[Any, ...]]:
     return get_args(_orig)
 
 
+def numpy_or_none() -> Optional[Any]:
+    # numpy is optional: callers use it to vectorize bulk work when it is installed and fall back to Python otherwise.
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def get_backend() -> MemoryBackend:
+    return _BACKEND
+
+
+def set_backend(backend: MemoryBackend) -> MemoryBackend:
+    global _BACKEND
+    previous, _BACKEND = _BACKEND, backend
+    return previous
+
+
+@contextmanager
+def use_backend(backend: MemoryBackend):
+    previous = set_backend(backend)
+    try:
+        yield backend
+    finally:
+        set_backend(previous)
+
+
+def readable(address: int, size: int = 1) -> bool:
+    return _BACKEND.memory_map.readable(address, size)
+
+
+@contextmanager
+def attach(pid: int):
+    backend = FileMemoryBackend(pid)
+    try:
+        with use_backend(backend):
+            yield backend
+    finally:
+        backend.close()
+
+
+class MemoryCursor:
+    def __init__(self, backend: MemoryBackend, address: int = 0):
+        self.backend = backend
+        self.address = address
+
+    def tell(self) -> int:
+        return self.address
+
+    def seek(self, address: int) -> int:
+        self.address = address
+        return address
+
+    def read(self, size: int) -> bytes:
+        data = self.backend.read(self.address, size)
+        self.address += len(data)
+        return data
+
+    def write(self, data: bytes) -> int:
+        written = self.backend.write(self.address, data)
+        self.address += written
+        return written
+
+
 @contextmanager
 def memory(address: Optional[int] = None):
-    tmp = _MEMORY.tell()
-    if address is not None:
-        _MEMORY.seek(address)
-    yield _MEMORY
-    _MEMORY.seek(tmp)
+    yield MemoryCursor(_BACKEND, address or 0)
 
 
 @atexit.register
 def __close_memory():
-    _MEMORY.close()
+    _BACKEND.close()
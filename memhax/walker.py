@@ -0,0 +1,130 @@
+from textwrap import indent
+from typing import Optional, Iterable, Tuple, List, Dict, Set, Any, Iterator
+
+from memhax.utils import CONFIG
+
+__all__ = ("Visitor", "walk", "iter_walk", "render_repr", "join_repr")
+
+# (label, child element, whether the edge dereferences a pointer)
+Edge = Tuple[Optional[str], Any, bool]
+
+
+class Visitor:
+    def enter(self, element, label: Optional[str], depth: int) -> bool:
+        # Return False to skip the children of this element; leave() is still called.
+        return True
+
+    def children(self, element) -> Iterable[Edge]:
+        return element.children()
+
+    def leave(self, element, label: Optional[str], depth: int) -> None:
+        pass
+
+    def revisit(self, element, label: Optional[str], depth: int) -> None:
+        # A pointer leads back to an element that is on the current path, or was already visited in unique mode.
+        pass
+
+    def prune(self, element, label: Optional[str], depth: int) -> None:
+        # The element was not entered because the depth or node budget ran out.
+        pass
+
+
+def iter_walk(root, visitor: Visitor, max_depth: Optional[int] = None, max_nodes: Optional[int] = None, unique: bool = False) -> Iterator[Tuple[Any, Optional[str], int]]:
+    # Iterative depth-first traversal over Element.children(), yielding (element, label, depth) after each leave().
+    # By default only pointers back into the current path are cut, so shared objects are visited once per path.
+    # With unique=True every pointer target is entered at most once.
+    on_path: Dict[int, int] = {}
+    seen: Set[int] = set()
+    frames: List[Tuple[Any, Optional[str], int, Any]] = []
+    nodes = 0
+
+    def push(element, label: Optional[str], depth: int) -> None:
+        nonlocal nodes
+        nodes += 1
+        on_path[element.address] = on_path.get(element.address, 0) + 1
+        descend = visitor.enter(element, label, depth)
+        frames.append((element, label, depth, iter(visitor.children(element) if descend else ())))
+
+    if unique:
+        seen.add(root.address)
+    push(root, None, 0)
+
+    while frames:
+        element, label, depth, edges = frames[-1]
+        edge = next(edges, None)
+        if edge is None:
+            frames.pop()
+            count = on_path[element.address] - 1
+            if count:
+                on_path[element.address] = count
+            else:
+                del on_path[element.address]
+            visitor.leave(element, label, depth)
+            yield element, label, depth
+            continue
+
+        child_label, child, deref = edge
+        if deref:
+            if child.address in (seen if unique else on_path):
+                visitor.revisit(child, child_label, depth + 1)
+                continue
+        if (max_depth is not None and depth + 1 > max_depth) or (max_nodes is not None and nodes >= max_nodes):
+            visitor.prune(child, child_label, depth + 1)
+            continue
+        if deref and unique:
+            seen.add(child.address)
+        push(child, child_label, depth + 1)
+
+
+def walk(root, visitor: Visitor, max_depth: Optional[int] = None, max_nodes: Optional[int] = None, unique: bool = False) -> int:
+    # Runs iter_walk() to completion; returns the number of elements entered.
+    nodes = 0
+    for _ in iter_walk(root, visitor, max_depth, max_nodes, unique):
+        nodes += 1
+    return nodes
+
+
+class _ReprVisitor(Visitor):
+    def __init__(self, rich: bool):
+        self.rich = rich
+        self.result = ""
+        self._frames: List[Tuple[Optional[Iterable[Edge]], List[Tuple[Optional[str], str]]]] = []
+
+    def enter(self, element, label: Optional[str], depth: int) -> bool:
+        self._frames.append((element.repr_children(), []))
+        return True
+
+    def children(self, element) -> Iterable[Edge]:
+        return self._frames[-1][0] or ()
+
+    def _emit(self, label: Optional[str], text: str) -> None:
+        if self._frames:
+            self._frames[-1][1].append((label, text))
+        else:
+            self.result = text
+
+    def leave(self, element, label: Optional[str], depth: int) -> None:
+        edges, parts = self._frames.pop()
+        if edges is None:
+            text = element.repr_rich([]) if self.rich else element.repr_simple([])
+        else:
+            text = element.repr_format(parts, self.rich)
+        self._emit(label, text)
+
+    def revisit(self, element, label: Optional[str], depth: int) -> None:
+        self._emit(label, "...")
+
+    def prune(self, element, label: Optional[str], depth: int) -> None:
+        self._emit(label, "...")
+
+
+def render_repr(element) -> str:
+    visitor = _ReprVisitor(not CONFIG["simplified_repr"])
+    walk(element, visitor, CONFIG["repr_max_depth"], CONFIG["repr_max_nodes"])
+    return visitor.result
+
+
+def join_repr(parts: List[str]) -> str:
+    if CONFIG["pretty_repr"]:
+        return "\n" + ",\n".join(indent(part, "    ") for part in parts) + "\n"
+    return ", ".join(parts)